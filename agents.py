@@ -0,0 +1,154 @@
+import random
+from collections import ChainMap
+import numpy as np  # type: ignore
+from dqn_agent import NumpyDQNPolicy
+from dummy_rl_policy import Dummy_RL_Policy
+from q_agent import QAgent
+from q_table import MappedQTable
+from solver import Solver
+from uct_tree import uct_tree
+
+AGENT_TYPES = ("UR", "UCT", "QL", "DQN", "AB")
+
+
+class RandomAgent:
+    """Plays a uniformly random legal column."""
+
+    def reset(self, player):
+        pass
+
+    def SelectMove(self, board, player):
+        return random.choice(board.AvailableColumns())
+
+
+class UCTAgent:
+    """Plays the move chosen by a UCT search; the tree is kept for the rest of the game."""
+
+    def __init__(self, num_simulations=200, store="object", time_budget_ms=None, rollout_policy=None):
+        self.num_simulations = num_simulations
+        self.store = store
+        self.time_budget_ms = time_budget_ms
+        self.rollout_policy = rollout_policy
+        self.tree = None
+
+    def reset(self, player):
+        self.tree = None
+
+    def SelectMove(self, board, player):
+        if self.tree is None:
+            self.tree = uct_tree(player, Dummy_RL_Policy(), board, num_simulations=self.num_simulations,
+                                 store=self.store, rollout_policy=self.rollout_policy)
+        return self.tree.search(board, time_budget_ms=self.time_budget_ms)
+
+
+class QLearningAgent:
+    """Plays greedily from a Q-table; states it has never seen fall back to the first legal column."""
+
+    def __init__(self, q_table_path=None, epsilon=0.0):
+        # A read-only view of the table, so several processes can share one file
+        table = {} if q_table_path is None else ChainMap({}, MappedQTable(q_table_path, mode='r'))
+        self.agent = QAgent(Q_table=table, epsilon=epsilon)
+
+    def reset(self, player):
+        pass
+
+    def SelectMove(self, board, player):
+        _, column = self.agent.QLearningMove(player, board)
+        return column
+
+
+class DQNPolicyAgent:
+    """Plays the greedy legal move of exported DQN weights (see DQNAgent.export_numpy)."""
+
+    def __init__(self, dqn_weights):
+        self.policy = NumpyDQNPolicy.load(dqn_weights)
+
+    def reset(self, player):
+        pass
+
+    def SelectMove(self, board, player):
+        state = np.reshape(board.StateToGrid(), [1, board.rows * board.cols])
+        legal = [col in board.AvailableColumns() for col in range(board.cols)]
+        return self.policy.act(state, legal)
+
+    def SelectMoves(self, boards, players):
+        """Pick moves for many boards with one forward pass."""
+        states = np.array([np.ravel(board.StateToGrid()) for board in boards], dtype=np.float32)
+        legal = np.array([[col in board.AvailableColumns() for col in range(board.cols)] for board in boards])
+        q_values = np.where(legal, self.policy.predict(states), -np.inf)
+        return np.argmax(q_values, axis=1).tolist()
+
+
+class SolverAgent:
+    """Plays the move of an alpha-beta search limited by depth and/or time_budget_ms."""
+
+    def __init__(self, depth=None, time_budget_ms=200, table_size=1 << 20):
+        self.solver = None
+        self.depth = depth
+        self.time_budget_ms = time_budget_ms
+        self.table_size = table_size
+
+    def reset(self, player):
+        pass
+
+    def SelectMove(self, board, player):
+        if self.solver is None:
+            self.solver = Solver(board.rows, board.cols, table_size=self.table_size)
+        return self.solver.search(board, player, depth=self.depth, time_budget_ms=self.time_budget_ms)
+
+
+_AGENT_CLASSES = {"UR": RandomAgent, "UCT": UCTAgent, "QL": QLearningAgent, "DQN": DQNPolicyAgent,
+                  "AB": SolverAgent}
+
+
+def ParseSpec(spec):
+    """Split an agent spec such as 'UCT:num_simulations=400,store=array' into (type, options)."""
+    agent_type, _, option_text = spec.partition(':')
+    agent_type = agent_type.strip().upper()
+    if agent_type not in _AGENT_CLASSES:
+        raise ValueError(f"Invalid agent type: {agent_type}. Valid types: {', '.join(AGENT_TYPES)}.")
+    options = {}
+    for item in filter(None, option_text.split(',')):
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f"Invalid agent option '{item}' in '{spec}'; expected name=value.")
+        options[name.strip()] = _OptionValue(value.strip())
+    return agent_type, options
+
+
+def _OptionValue(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return None if value == "None" else value
+
+
+def MakeAgent(spec):
+    """Build an agent from a spec string; every agent has reset(player) and SelectMove(board, player)."""
+    agent_type, options = ParseSpec(spec)
+    try:
+        return _AGENT_CLASSES[agent_type](**options)
+    except TypeError as error:
+        raise ValueError(f"Invalid options for {agent_type} agent in '{spec}': {error}") from None
+
+
+def HasBatchedMoves(spec):
+    """Return True when the agent built from spec picks moves for many boards in one call (see SelectMoves)."""
+    return hasattr(_AGENT_CLASSES[ParseSpec(spec)[0]], 'SelectMoves')
+
+
+def SelectMoves(agent, boards, players):
+    """Return agent's move for every (board, player) pair, each an independent position.
+
+    Agents with a batched SelectMoves (such as DQNPolicyAgent) evaluate all
+    boards at once; the others are reset and asked one board at a time.
+    """
+    if hasattr(agent, 'SelectMoves'):
+        return agent.SelectMoves(boards, players)
+    moves = []
+    for board, player in zip(boards, players):
+        agent.reset(player)
+        moves.append(agent.SelectMove(board, player))
+    return moves
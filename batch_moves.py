@@ -0,0 +1,168 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np  # type: ignore
+from board import *
+from file_reader import File_Reader, InvalidPosition
+from agents import MakeAgent, ParseSpec, SelectMoves as AgentMoves
+from opening_book import OpeningBook
+
+DEFAULT_ALGORITHM = "AB"  # Used for JSONL positions that name no algorithm
+
+_AGENTS = {}  # Agents built in this worker process, by spec
+_BOOKS = {}  # Opening books opened in this worker process, by path
+
+
+def _Agent(spec):
+    if spec not in _AGENTS:
+        _AGENTS[spec] = MakeAgent(spec)
+    return _AGENTS[spec]
+
+
+def _Book(path):
+    if path not in _BOOKS:
+        _BOOKS[path] = OpeningBook(path)
+    return _BOOKS[path]
+
+
+def _Prepare(algorithm, player, grid, book):
+    """Validate one position and return (result, board); board is None once result is final."""
+    algorithm = (algorithm or DEFAULT_ALGORITHM).strip().upper()
+    player = player.strip().upper() if isinstance(player, str) else player
+    result = {'algorithm': algorithm, 'player': player, 'move': None}
+    if isinstance(grid, InvalidPosition):
+        raise ValueError(str(grid))
+    if player not in PLAYER_INDEX:
+        raise ValueError(f"Invalid player color: {player}.")
+    if not grid or any(len(row) != len(grid[0]) for row in grid):
+        raise ValueError("Board rows must all have the same length.")
+    board = Board(len(grid), len(grid[0]))
+    board.board = grid
+    if not board.AvailableColumns() or board.CheckWin('R') or board.CheckWin('Y'):
+        return result, None
+    book_move = _Book(book).Lookup(board, player) if book else None
+    if book_move is not None:
+        result.update(move=book_move[0], source='book')
+        return result, None
+    return result, board
+
+
+def SelectMoves(positions, specs=None, book=None):
+    """Return a result dict with the chosen column for every (algorithm, player, grid) in positions.
+
+    specs maps an algorithm type to the agent spec used for it (see
+    agents.MakeAgent); types without an entry use their defaults. book is
+    an opening book path consulted first. Positions for the same agent are
+    evaluated together with agents.SelectMoves. Invalid positions produce a
+    result with an 'error' instead of raising.
+    """
+    results = []
+    groups = {}  # Agent spec -> indexes of the positions it still has to move in
+    boards = {}
+    for index, (algorithm, player, grid) in enumerate(positions):
+        try:
+            result, board = _Prepare(algorithm, player, grid, book)
+            if board is not None:
+                spec = (specs or {}).get(result['algorithm'], result['algorithm'])
+                ParseSpec(spec)
+                groups.setdefault(spec, []).append(index)
+                boards[index] = board
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            result = {'algorithm': algorithm, 'player': player, 'move': None, 'error': str(e)}
+        results.append(result)
+
+    for spec, indexes in groups.items():
+        try:
+            moves = AgentMoves(_Agent(spec), [boards[i] for i in indexes], [results[i]['player'] for i in indexes])
+        except (ValueError, TypeError) as e:
+            for i in indexes:
+                results[i]['error'] = str(e)
+            continue
+        for i, move in zip(indexes, moves):
+            results[i]['move'] = int(move)
+    return results
+
+
+def SelectMove(algorithm, player, grid, specs=None, book=None):
+    """Return the result dict for a single position (see SelectMoves)."""
+    return SelectMoves([(algorithm, player, grid)], specs, book)[0]
+
+
+def _BatchWorker(args):
+    """Pick moves for a chunk of (index, algorithm, player, grid) positions."""
+    chunk, specs, book, seed = args
+    random.seed(seed)
+    np.random.seed(seed % (1 << 32))
+    results = SelectMoves([position for _, *position in chunk], specs, book)
+    return [dict(index=index, **result) for (index, *_), result in zip(chunk, results)]
+
+
+def _Chunks(positions, chunk_size):
+    """Group the position stream into lists of chunk_size (index, algorithm, player, grid) tuples."""
+    numbered = ((index, *position) for index, position in enumerate(positions))
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def BatchMoves(positions, specs=None, book=None, workers=None, chunk_size=64, max_in_flight=None, seed=0):
+    """Yield a move result for every position, in input order, as soon as it is ready.
+
+    positions is any iterable of (algorithm, player, grid), such as
+    File_Reader.read_positions(). It is consumed lazily: at most
+    max_in_flight chunks (default twice the workers) are queued or running
+    at a time, so memory stays bounded however long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    rng = random.Random(seed)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _Chunks(positions, chunk_size):
+            if len(pending) >= max_in_flight:  # Back-pressure: wait for the oldest chunk before reading more
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_BatchWorker, (chunk, specs, book, rng.getrandbits(63))))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def RunBatch(input_path, output_path, specs=None, book=None, workers=None, chunk_size=64, max_in_flight=None,
+             seed=0):
+    """Stream positions from input_path and write one JSON move result per line to output_path."""
+    for spec in (specs or {}).values():
+        ParseSpec(spec)  # Fail on a bad spec before any process starts
+    start = time.perf_counter()
+    count = errors = 0
+    with open(output_path, 'w') as output:
+        for result in BatchMoves(File_Reader(input_path).read_positions(), specs, book, workers, chunk_size,
+                                 max_in_flight, seed):
+            output.write(json.dumps(result) + '\n')
+            count += 1
+            errors += 'error' in result
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {count} moves to {output_path} in {elapsed:.1f}s "
+          f"({count / elapsed if elapsed > 0 else 0.0:.1f} positions/s, {errors} errors)")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick moves for a file of positions (text or JSONL).")
+    parser.add_argument("input", help="positions in the test.txt format, repeated, or JSONL")
+    parser.add_argument("output", help="JSONL file of move results, in input order")
+    parser.add_argument("--agent", action="append", default=[],
+                        help="agent spec used for positions of its type, e.g. UCT:num_simulations=400 (repeatable)")
+    parser.add_argument("--book", default=None, help="opening book consulted before any agent")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="chunks queued at once (default 2x workers)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    RunBatch(args.input, args.output, {ParseSpec(spec)[0]: spec for spec in args.agent}, args.book,
+             args.workers, args.chunk_size, args.max_in_flight, args.seed)
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np  # type: ignore
+from board import *
+from dummy_rl_policy import Dummy_RL_Policy
+from q_agent import QAgent
+from uct_tree import uct_tree
+
+# Reference positions as move lists from the empty board (columns 0-6, red first)
+REFERENCE_POSITIONS = {
+    'empty': [],
+    'opening': [3, 3, 2, 4],
+    'middlegame': [3, 3, 3, 2, 4, 4, 2, 5, 1, 0, 5, 6],
+    'crowded': [5, 3, 2, 3, 1, 5, 3, 1, 0, 1, 4, 1, 2, 5, 0, 5, 6, 6, 2, 0, 6, 0, 4, 2],
+}
+UCT_BUDGETS = (50, 200, 800)
+SEED = 1234
+DEFAULT_TOLERANCE = 0.10  # Relative change treated as noise when comparing with a baseline
+
+
+def ReferenceBoards():
+    """Return {name: Board} for the reference positions."""
+    boards = {}
+    for name, moves in REFERENCE_POSITIONS.items():
+        board = Board()
+        for col in moves:
+            board.play(col)
+        boards[name] = board
+    return boards
+
+
+def _Seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def _Percentiles(samples_ms):
+    return {f"latency_p{p}_ms": float(np.percentile(samples_ms, p)) for p in (50, 90, 99)}
+
+
+def BenchBoard(scale=1.0):
+    """Moves/sec for play+undo through seeded random games, and CheckWin calls/sec."""
+    _Seed(SEED)
+    games = [[] for _ in range(max(1, int(200 * scale)))]
+    for moves in games:
+        board = Board()
+        while board.AvailableColumns():
+            col = random.choice(board.AvailableColumns())
+            moves.append(col)
+            if board.play(col):
+                break
+
+    board = Board()
+    start = time.perf_counter()
+    count = 0
+    for moves in games:
+        for col in moves:
+            board.play(col)
+        for col in reversed(moves):
+            board.undo(col)
+        count += 2 * len(moves)
+    move_rate = count / (time.perf_counter() - start)
+
+    boards = list(ReferenceBoards().values())
+    checks = max(1, int(20000 * scale))
+    start = time.perf_counter()
+    for i in range(checks):
+        boards[i % len(boards)].CheckWin('R' if i & 1 else 'Y')
+    return {'moves_per_sec': move_rate, 'win_checks_per_sec': checks / (time.perf_counter() - start)}
+
+
+def BenchUCT(budget, scale=1.0):
+    """Simulations/sec and per-search latency of uct_tree.search with a budget of simulations."""
+    _Seed(SEED)
+    latencies, simulations = [], 0
+    repeats = max(1, int(3 * scale))
+    for _ in range(repeats):
+        for board in ReferenceBoards().values():
+            player = 'R' if len(board.moves) % 2 == 0 else 'Y'
+            tree = uct_tree(player, Dummy_RL_Policy(), board, num_simulations=budget)
+            start = time.perf_counter()
+            tree.search(board)
+            latencies.append((time.perf_counter() - start) * 1000)
+            simulations += tree.stats['simulations']
+    return {'simulations_per_sec': simulations / (sum(latencies) / 1000), **_Percentiles(latencies)}
+
+
+def BenchQLearning(scale=1.0):
+    """Q-learning self-play episodes/sec (episode play plus table update)."""
+    _Seed(SEED)
+    agent = QAgent()
+    board = Board()
+    episodes = max(1, int(300 * scale))
+    start = time.perf_counter()
+    for _ in range(episodes):
+        agent.ApplyHistory(agent.PlayEpisode('R', board))
+    return {'episodes_per_sec': episodes / (time.perf_counter() - start)}
+
+
+def BenchDQNReplay(scale=1.0, batch_size=32):
+    """DQNAgent.replay steps/sec on a buffer of seeded random transitions."""
+    from dqn_agent import DQNAgent
+    _Seed(SEED)
+    try:
+        agent = DQNAgent(ROWS * COLUMNS, COLUMNS)
+    except ImportError as error:
+        return {'skipped': f"TensorFlow unavailable: {error}"}
+    states = np.random.randint(0, 3, (agent.memory.capacity, ROWS * COLUMNS)).astype(np.float32)
+    for i in range(agent.memory.capacity):
+        agent.remember(states[i], i % COLUMNS, float(i % 3 - 1), states[(i + 1) % len(states)], i % 10 == 0)
+    agent.replay(batch_size)  # Warm-up: the first call traces the model
+    steps = max(1, int(50 * scale))
+    start = time.perf_counter()
+    for _ in range(steps):
+        agent.replay(batch_size)
+    return {'replay_steps_per_sec': steps / (time.perf_counter() - start)}
+
+
+BENCHMARKS = {
+    'board': BenchBoard,
+    **{f'uct_{budget}': (lambda scale, budget=budget: BenchUCT(budget, scale)) for budget in UCT_BUDGETS},
+    'q_learning': BenchQLearning,
+    'dqn_replay': BenchDQNReplay,
+}
+
+
+def RunBenchmarks(names=None, scale=1.0, repeat=3):
+    """Run the named benchmarks (all by default) and return the results document.
+
+    Each benchmark runs repeat times and keeps its best value per metric:
+    the highest rate, or the lowest latency.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}. Valid benchmarks: {', '.join(BENCHMARKS)}.")
+        print(f"Running {name}...")
+        runs = [BENCHMARKS[name](scale) for _ in range(repeat)]
+        if 'skipped' in runs[0]:
+            results[name] = runs[0]
+            continue
+        results[name] = {metric: (min if _LowerIsBetter(metric) else max)(run[metric] for run in runs)
+                         for metric in runs[0]}
+    return {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                 'seed': SEED, 'scale': scale, 'repeat': repeat},
+        'results': results,
+    }
+
+
+def _LowerIsBetter(metric):
+    return metric.endswith('_ms')
+
+
+def Compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print every metric against the baseline and return the names of those that regressed."""
+    regressions = []
+    print(f"{'metric':45s}{'baseline':>14s}{'current':>14s}{'change':>9s}")
+    for name, metrics in current['results'].items():
+        base = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            if metric == 'skipped' or not isinstance(base.get(metric), (int, float)):
+                continue
+            change = value / base[metric] - 1.0 if base[metric] else 0.0
+            worse = change > tolerance if _LowerIsBetter(metric) else change < -tolerance
+            better = change < -tolerance if _LowerIsBetter(metric) else change > tolerance
+            status = 'REGRESSION' if worse else 'improved' if better else 'ok'
+            print(f"{name + '.' + metric:45s}{base[metric]:14.2f}{value:14.2f}{change:+9.1%}  {status}")
+            if worse:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the board, UCT, Q-learning and DQN training.")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results (JSON)")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--only", help="comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the work per benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    report = RunBenchmarks(args.only.split(',') if args.only else None, args.scale, args.repeat)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = Compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}.")
+            sys.exit(1)
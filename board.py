@@ -1,69 +1,333 @@
+import random
+
 ROWS = 6
 COLUMNS = 7
 SYMBOLS = {'o': 0, 'r': 1, 'y': 2, 'red': 1, 'yellow': 2}
 INT_TO_SYMBOL = {0: 'O', 1: 'R', 2: 'Y'}
+PLAYER_INDEX = {'R': 0, 'Y': 1}
+ZOBRIST_SEED = 20250501
+TURN_KEY = random.Random(ZOBRIST_SEED).getrandbits(64)  # XORed into keys that must tell whose turn it is
 Q_table = {}
+_AVAILABLE = {}  # Available-column lists per full-column mask, cached per board width
+_ZOBRIST = {}  # Zobrist keys per (rows, cols), indexed [player][bit]
+
+
+def _ZobristTable(rows, cols):
+    """Return the fixed-seed Zobrist keys for a board size, so hashes are stable across runs."""
+    if (rows, cols) not in _ZOBRIST:
+        rng = random.Random(ZOBRIST_SEED + rows * 100 + cols)
+        bits = cols * (rows + 1)
+        _ZOBRIST[(rows, cols)] = [[rng.getrandbits(64) for _ in range(bits)] for _ in range(2)]
+    return _ZOBRIST[(rows, cols)]
+
+
+def _HasFour(bits, height):
+    """Return True if the bitboard contains four in a row in any direction."""
+    # Vertical, horizontal, diagonal (/) and diagonal (\) shifts
+    for shift in (1, height, height + 1, height - 1):
+        pairs = bits & (bits >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+def WinningCells(position, height):
+    """Return every cell that would give the bitboard position four in a row.
+
+    The result is not masked to the board: callers keep only the cells they
+    can actually play.
+    """
+    r = (position << 1) & (position << 2) & (position << 3)  # Vertical
+    for shift in (height, height - 1, height + 1):  # Horizontal and both diagonals
+        p = (position << shift) & (position << 2 * shift)
+        r |= p & (position << 3 * shift)
+        r |= p & (position >> shift)
+        p = (position >> shift) & (position >> 2 * shift)
+        r |= p & (position << shift)
+        r |= p & (position >> 3 * shift)
+    return r
+
+
+class _RowView:
+    """List-like view of one board row backed by the bitboards."""
+    __slots__ = ('_board', '_row')
+
+    def __init__(self, board, row):
+        self._board = board
+        self._row = row
+
+    def __len__(self):
+        return self._board.cols
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [self._board.GetCell(self._row, c) for c in range(self._board.cols)[col]]
+        return self._board.GetCell(self._row, self._Column(col))
+
+    def __setitem__(self, col, value):
+        self._board.SetCell(self._row, self._Column(col), value)
+
+    def _Column(self, col):
+        col = int(col)  # NumPy integers would turn the bitboards into fixed-width ints
+        if col < 0:
+            col += self._board.cols
+        if not 0 <= col < self._board.cols:
+            raise IndexError("board column index out of range")
+        return col
+
+    def __iter__(self):
+        return (self._board.GetCell(self._row, c) for c in range(self._board.cols))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def copy(self):
+        return list(self)
+
+
+class _GridView:
+    """List-of-lists view of the board kept for code that indexes board.board[row][col]."""
+    __slots__ = ('_board',)
+
+    def __init__(self, board):
+        self._board = board
+
+    def __len__(self):
+        return self._board.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [_RowView(self._board, r) for r in range(self._board.rows)[row]]
+        row = int(row)
+        if row < 0:
+            row += self._board.rows
+        if not 0 <= row < self._board.rows:
+            raise IndexError("board row index out of range")
+        return _RowView(self._board, row)
+
+    def __iter__(self):
+        return (_RowView(self._board, r) for r in range(self._board.rows))
+
+    def __eq__(self, other):
+        return [list(row) for row in self] == [list(row) for row in other]
+
+    def __repr__(self):
+        return repr([list(row) for row in self])
+
 
 class Board:
+    """Connect Four board stored as one bitboard per player plus column heights.
+
+    Bit ``col * (rows + 1) + height`` is set when the cell ``height`` rows above
+    the bottom of ``col`` is occupied; the extra bit per column is a sentinel
+    that keeps the shift-based win check from wrapping between columns.
+    ``board.board`` remains available as a list-of-lists compatibility view.
+    """
+
     def __init__(self, rows=6, cols=7):
         self.rows = rows
         self.cols = cols
-        self.board = [['O' for _ in range(cols)] for _ in range(rows)]
+        self.height = rows + 1
+        self.column_mask = (1 << rows) - 1
+        if cols not in _AVAILABLE:
+            _AVAILABLE[cols] = [[col for col in range(cols) if not full >> col & 1]
+                                for full in range(1 << cols)]
+        self._available = _AVAILABLE[cols]
+        self._zobrist = _ZobristTable(rows, cols)
+        self._view = _GridView(self)
+        self.reset()
 
     def reset(self):
         """Reset the board to an empty state."""
-        self.board = [['O' for _ in range(self.cols)] for _ in range(self.rows)]
+        self.bitboards = [0, 0]  # One mask per player, indexed by PLAYER_INDEX
+        self.heights = [0] * self.cols
+        self.full = 0  # Bit per column that has no space left
+        self.moves = []
+        self.hash = 0  # Zobrist hash of the position, updated on every change
+        self.mirror_hash = 0  # Zobrist hash of the left-right mirrored position
+
+    @property
+    def board(self):
+        return self._view
+
+    @board.setter
+    def board(self, grid):
+        grid = [list(row) for row in grid]  # Snapshot first in case grid is our own view
+        self.reset()
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                if self._CellPlayer(cell) is not None:
+                    self.SetCell(r, c, cell)
 
     def copy(self):
         """Return a copy of the board."""
-        new_board = Board(self.rows, self.cols)
-        new_board.board = [row.copy() for row in self.board]  # Ensure deep copy of each row
+        new_board = Board.__new__(Board)
+        new_board.rows = self.rows
+        new_board.cols = self.cols
+        new_board.height = self.height
+        new_board.column_mask = self.column_mask
+        new_board._available = self._available
+        new_board._zobrist = self._zobrist
+        new_board._view = _GridView(new_board)
+        new_board.bitboards = self.bitboards.copy()
+        new_board.heights = self.heights.copy()
+        new_board.full = self.full
+        new_board.moves = self.moves.copy()
+        new_board.hash = self.hash
+        new_board.mirror_hash = self.mirror_hash
         return new_board
 
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __getstate__(self):
+        # Shared lookup tables and the grid view are rebuilt on unpickling
+        return {'rows': self.rows, 'cols': self.cols, 'bitboards': self.bitboards,
+                'heights': self.heights, 'full': self.full, 'moves': self.moves, 'hash': self.hash,
+                'mirror_hash': self.mirror_hash}
+
+    def __setstate__(self, state):
+        self.__init__(state['rows'], state['cols'])
+        for name in ('bitboards', 'heights', 'full', 'moves', 'hash', 'mirror_hash'):
+            setattr(self, name, state[name])
+
     def PrintBoard(self):
         """Print the current state of the board."""
         for row in self.board:
             print('|'.join(row))
         print('-' * (self.cols * 2 - 1))
 
+    def _CellPlayer(self, cell):
+        """Return the player index for a cell value, or None for an empty cell."""
+        if isinstance(cell, str):
+            return PLAYER_INDEX.get(INT_TO_SYMBOL.get(SYMBOLS.get(cell.lower(), 0)))
+        return PLAYER_INDEX.get(INT_TO_SYMBOL.get(cell))
+
+    def GetCell(self, row, col):
+        """Return 'O', 'R' or 'Y' for the cell at grid position (row, col)."""
+        row, col = int(row), int(col)
+        bit = 1 << (col * self.height + self.rows - 1 - row)
+        if self.bitboards[0] & bit:
+            return 'R'
+        if self.bitboards[1] & bit:
+            return 'Y'
+        return 'O'
+
+    def SetCell(self, row, col, value):
+        """Set the cell at grid position (row, col) to 'O', 'R' or 'Y'."""
+        row, col = int(row), int(col)
+        position = col * self.height + self.rows - 1 - row
+        mirror = (self.cols - 1 - col) * self.height + self.rows - 1 - row
+        bit = 1 << position
+        player = self._CellPlayer(value)
+        for index in (0, 1):
+            if self.bitboards[index] & bit:
+                self.bitboards[index] &= ~bit
+                self.hash ^= self._zobrist[index][position]
+                self.mirror_hash ^= self._zobrist[index][mirror]
+        if player is not None:
+            self.bitboards[player] |= bit
+            self.hash ^= self._zobrist[player][position]
+            self.mirror_hash ^= self._zobrist[player][mirror]
+        # Recompute the column height from its topmost occupied cell
+        occupied = (self.bitboards[0] | self.bitboards[1]) >> (col * self.height) & self.column_mask
+        self.heights[col] = occupied.bit_length()
+        if self.heights[col] == self.rows:
+            self.full |= 1 << col
+        else:
+            self.full &= ~(1 << col)
+
+    def play(self, col, player=None):
+        """Drop a piece for player ('R' or 'Y') in col and return True if it wins.
+
+        When player is omitted, 'R' moves on even piece counts and 'Y' on odd ones.
+        """
+        col = int(col)  # Columns from np.argmax must not make the bitboards NumPy ints
+        if player is None:
+            player = 'R' if sum(self.heights) % 2 == 0 else 'Y'
+        height = self.heights[col]
+        if height == self.rows:
+            raise ValueError(f"Column {col} is full.")
+        index = PLAYER_INDEX[player]
+        position = col * self.height + height
+        self.bitboards[index] |= 1 << position
+        self.hash ^= self._zobrist[index][position]
+        self.mirror_hash ^= self._zobrist[index][(self.cols - 1 - col) * self.height + height]
+        self.heights[col] = height + 1
+        if height + 1 == self.rows:
+            self.full |= 1 << col
+        self.moves.append(col)
+        return _HasFour(self.bitboards[index], self.height)
+
+    def undo(self, col=None):
+        """Remove the top piece of col (defaults to the last column played).
+
+        Moves are undone last first: col must be the last column played,
+        unless the board holds no played moves (only pieces set through
+        the grid).
+        """
+        col = self.moves[-1] if col is None else int(col)
+        if self.moves and self.moves[-1] != col:
+            raise ValueError(f"Column {col} is not the last move played (column {self.moves[-1]}).")
+        height = self.heights[col] - 1
+        if height < 0:
+            raise ValueError(f"Column {col} is empty.")
+        position = col * self.height + height
+        index = 0 if self.bitboards[0] >> position & 1 else 1
+        self.bitboards[index] &= ~(1 << position)
+        self.hash ^= self._zobrist[index][position]
+        self.mirror_hash ^= self._zobrist[index][(self.cols - 1 - col) * self.height + height]
+        self.heights[col] = height
+        self.full &= ~(1 << col)
+        if self.moves:
+            self.moves.pop()
+
     def AvailableColumns(self):
         """Return a list of columns that have space available."""
-        return [col for col in range(self.cols) if self.board[0][col] == 'O']
+        return self._available[self.full].copy()
 
     def AvailableRowInColumn(self, column):
         """Find the first available row in the column."""
-        for row in reversed(range(self.rows)):  # Start from the bottom row
-            if self.board[row][column] == 'O':
-                return row
-        return -1  # If the column is full, return -1
+        height = self.heights[column]
+        if height == self.rows:
+            return -1  # If the column is full, return -1
+        return self.rows - 1 - height
 
     def CheckWin(self, player):
         """Check if the player has won."""
-        # Horizontal check
-        for r in range(self.rows):
-            for c in range(self.cols - 3):
-                if all(self.board[r][c + i] == player for i in range(4)):
-                    return True
-
-        # Vertical check
-        for r in range(self.rows - 3):
-            for c in range(self.cols):
-                if all(self.board[r + i][c] == player for i in range(4)):
-                    return True
-
-        # Diagonal (bottom-left to top-right) check
-        for r in range(self.rows - 3):
-            for c in range(self.cols - 3):
-                if all(self.board[r + i][c + i] == player for i in range(4)):
-                    return True
-
-        # Diagonal (top-left to bottom-right) check
-        for r in range(3, self.rows):
-            for c in range(self.cols - 3):
-                if all(self.board[r - i][c + i] == player for i in range(4)):
-                    return True
-
-        return False
+        index = PLAYER_INDEX.get(player)
+        if index is None:
+            return False
+        return _HasFour(self.bitboards[index], self.height)
+
+    def WinningColumns(self, player):
+        """Return the columns where player's next piece would win, using bitmask threats."""
+        cells = WinningCells(self.bitboards[PLAYER_INDEX[player]], self.height)
+        return [col for col in self._available[self.full] if cells >> (col * self.height + self.heights[col]) & 1]
 
     def StateToKey(self):
+        """Return the 64-bit Zobrist hash used as the state key by every agent."""
+        return self.hash
+
+    def CanonicalKey(self):
+        """Return (key, mirrored) for the canonical form of the position.
+
+        A position and its left-right mirror share one canonical key: the
+        smaller of the two Zobrist hashes. mirrored is True when that key
+        belongs to the mirror image, in which case columns must be passed
+        through MirrorColumn to move between the board and the canonical frame.
+        """
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    def MirrorColumn(self, col):
+        """Return the column that col maps to in the left-right mirror image."""
+        return self.cols - 1 - col
+
+    def StateToGrid(self):
+        """Return the board as a nested tuple of ints (0 empty, 1 red, 2 yellow)."""
         return tuple(tuple(SYMBOLS[cell.lower()] for cell in row) for row in self.board)
@@ -0,0 +1,131 @@
+import json
+import os
+import queue
+import random
+import threading
+import numpy as np  # type: ignore
+
+MANIFEST = 'checkpoint.json'
+
+
+def RandomState():
+    """Return the state of the random and np.random generators as a JSON-friendly dict."""
+    version, internal, gauss = random.getstate()
+    name, keys, position, has_gauss, cached = np.random.get_state()
+    return {'random': [version, list(internal), gauss],
+            'numpy': [name, keys.tolist(), int(position), int(has_gauss), float(cached)]}
+
+
+def SetRandomState(state):
+    """Restore the generators from a dict returned by RandomState."""
+    version, internal, gauss = state['random']
+    random.setstate((version, tuple(internal), gauss))
+    name, keys, position, has_gauss, cached = state['numpy']
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), position, has_gauss, cached))
+
+
+class Checkpointer:
+    """Writes incremental training checkpoints to a directory from a background thread.
+
+    Each checkpoint is an .npz file of arrays plus a JSON state dict. Every
+    full_every-th checkpoint is full; those in between are deltas holding
+    only what changed since the previous one, and load() returns the chain
+    from the last full checkpoint so the caller can replay it. Files are
+    written under temporary names and renamed, and the manifest naming the
+    chain is replaced last, so a run killed mid-write resumes from the
+    previous complete checkpoint.
+    """
+
+    def __init__(self, directory, full_every=10):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.full_every = full_every
+        manifest = self._ReadManifest()
+        self.chain = manifest['chain']
+        self.number = manifest['number']
+        self.error = None
+        self.queue = queue.Queue(maxsize=2)  # Training only waits if the writer falls two checkpoints behind
+        self.thread = threading.Thread(target=self._Write, daemon=True)
+        self.thread.start()
+
+    def _ReadManifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {'number': 0, 'chain': []}
+        with open(path) as file:
+            return json.load(file)
+
+    def needs_full(self):
+        """Return True when the next checkpoint must be a full one."""
+        return not self.chain or len(self.chain) >= self.full_every
+
+    def save(self, arrays, state, full):
+        """Queue a checkpoint of arrays (a dict of NumPy arrays) and state (a JSON-serializable dict).
+
+        The arrays are written later on the writer thread, so they must be
+        copies that training will not modify. arrays may also be a function
+        returning that dict, which the writer thread calls, so costly
+        conversions happen off the training loop.
+        """
+        if self.error is not None:
+            raise self.error
+        self.number += 1
+        name = f"ckpt_{self.number:06d}_{'full' if full else 'delta'}.npz"
+        self.chain = [name] if full else self.chain + [name]
+        self.queue.put((name, arrays, json.dumps(state), {'number': self.number, 'chain': self.chain}))
+
+    def _Write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            name, arrays, state, manifest = item
+            try:
+                if callable(arrays):
+                    arrays = arrays()
+                self._Replace(name, lambda file: np.savez(file, state=np.array(state), **arrays))
+                self._Replace(MANIFEST, lambda file: file.write(json.dumps(manifest).encode()))
+                for stale in os.listdir(self.directory):  # Files of chains the manifest no longer names
+                    if stale.startswith('ckpt_') and stale not in manifest['chain']:
+                        os.remove(os.path.join(self.directory, stale))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _Replace(self, name, write):
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+    def load(self):
+        """Return [(arrays, state)] for the saved chain, full checkpoint first, or [] if there is none."""
+        self.flush()
+        chain = []
+        for name in self._ReadManifest()['chain']:
+            with np.load(os.path.join(self.directory, name)) as data:
+                arrays = {key: data[key] for key in data.files if key != 'state'}
+                chain.append((arrays, json.loads(str(data['state']))))
+        return chain
+
+    def flush(self):
+        """Wait until every queued checkpoint is on disk."""
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.flush()
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,21 +1,75 @@
+import os
 import random
-from collections import deque
+import time
 import numpy as np  # type: ignore
-import matplotlib.pyplot as plt  # type: ignore
-from tensorflow.keras.models import Sequential  # type: ignore
-from tensorflow.keras.layers import Dense, Input  # type: ignore
-from tensorflow.keras.optimizers import Adam  # type: ignore
 from board import *  # Assumes Board, ROWS, and COLUMNS are defined in board.py
+from vector_env import VectorBoard
+from metrics import RingMetricsSink
+from checkpoint import RandomState, SetRandomState
 
 SYMBOLS = {'r': 1, 'y': 2, 'red': 1, 'yellow': 2, 'R': 1, 'Y': 2}
 INT_TO_SYMBOL = {0: 'O', 1: 'R', 2: 'Y'}
 
 
+class ReplayBuffer:
+    """Fixed-size ring buffer of transitions kept in preallocated NumPy arrays."""
+
+    def __init__(self, capacity, state_size):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0  # Next slot to overwrite
+        self.size = 0
+        self.total = 0  # Transitions ever added, so checkpoints can tell which slots changed
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """Store one transition, overwriting the oldest once the buffer is full."""
+        i = self.position
+        self.states[i] = np.ravel(state)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = np.ravel(next_state)
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.total += 1
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """Store a batch of transitions given as arrays with one row per transition."""
+        n = len(actions)
+        idx = (self.position + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.total += n
+
+    def sample(self, batch_size):
+        """Return (states, actions, rewards, next_states, dones) arrays for batch_size random transitions."""
+        idx = np.random.choice(self.size, batch_size, replace=False)
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+    def slots_since(self, total):
+        """Return the slots written since the buffer had seen total transitions."""
+        if self.total - total >= self.capacity:
+            return np.arange(self.capacity)
+        return (total + np.arange(self.total - total)) % self.capacity
+
+
 class DQNAgent:
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, memory_size=2000):
         self.state_size = state_size
         self.action_size = action_size
-        self.memory = deque(maxlen=2000)
+        self.memory = ReplayBuffer(memory_size, state_size)
         self.gamma = 0.95
         self.epsilon = 1.0
         self.epsilon_min = 0.01
@@ -23,7 +77,19 @@ class DQNAgent:
         self.learning_rate = 0.001
         self.model = self._build_model()
 
+        # Bootstrap targets come from a copy of the network synced every target_update_freq train steps
+        self.target_model = self._build_model()
+        self.target_update_freq = 100
+        self.train_steps = 0
+        self.update_target_model()
+        self.checkpoint_total = 0  # memory.total at the last checkpoint
+
     def _build_model(self):
+        # TensorFlow is imported here so that serving with NumpyDQNPolicy never loads it
+        from tensorflow.keras.models import Sequential  # type: ignore
+        from tensorflow.keras.layers import Dense, Input  # type: ignore
+        from tensorflow.keras.optimizers import Adam  # type: ignore
+
         model = Sequential()
         model.add(Input(shape=(self.state_size,)))
         model.add(Dense(24, activation='relu'))
@@ -32,8 +98,11 @@ class DQNAgent:
         model.compile(loss='mse', optimizer=Adam(learning_rate=self.learning_rate))
         return model
 
+    def update_target_model(self):
+        self.target_model.set_weights(self.model.get_weights())
+
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def act(self, state):
         if np.random.rand() <= self.epsilon:
@@ -41,17 +110,30 @@ class DQNAgent:
         act_values = self.model.predict(state, verbose=0)
         return np.argmax(act_values[0])
 
+    def act_batch(self, states, legal):
+        """Choose one epsilon-greedy action per row of states with a single forward pass.
+
+        legal is a (N, action_size) bool mask; illegal columns are never chosen.
+        """
+        q_values = np.array(self.model.predict_on_batch(states))
+        greedy = np.argmax(np.where(legal, q_values, -np.inf), axis=1)
+        random_actions = np.argmax(np.where(legal, np.random.rand(*legal.shape), -1.0), axis=1)
+        explore = np.random.rand(len(states)) <= self.epsilon
+        return np.where(explore, random_actions, greedy)
+
     def replay(self, batch_size):
         if len(self.memory) < batch_size:
             return
-        minibatch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                target += self.gamma * np.amax(self.model.predict(next_state, verbose=0)[0])
-            target_f = self.model.predict(state, verbose=0)
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=1, verbose=0)
+        states, actions, rewards, next_states, dones = self.memory.sample(batch_size)
+
+        # One forward pass per network and one gradient step for the whole batch
+        targets = np.array(self.model.predict_on_batch(states))
+        future = np.amax(np.array(self.target_model.predict_on_batch(next_states)), axis=1)
+        targets[np.arange(batch_size), actions] = rewards + self.gamma * future * ~dones
+        self.model.train_on_batch(states, targets)
+        self.train_steps += 1
+        if self.train_steps % self.target_update_freq == 0:
+            self.update_target_model()
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
@@ -59,10 +141,165 @@ class DQNAgent:
         self.model.load_weights(name)
 
     def save(self, name):
+        """Save the Keras weights to name and a NumPy copy of them next to it (see export_numpy)."""
         self.model.save_weights(name)
+        self.export_numpy(NumpyWeightsPath(name))
+
+    def Checkpoint(self, checkpointer, episode, extra=None):
+        """Queue a checkpoint of the full training state with episode as the next episode to play.
+
+        Networks, optimizer slots and counters are saved every time; the
+        replay buffer is saved whole in full checkpoints and as the slots
+        written since the previous checkpoint in deltas. extra is a
+        JSON-serializable dict stored alongside (such as reward history).
+        """
+        full = checkpointer.needs_full()
+        memory = self.memory
+        slots = np.arange(memory.capacity) if full else memory.slots_since(self.checkpoint_total)
+        arrays = {'memory_slots': slots, 'memory_states': memory.states[slots], 'memory_actions': memory.actions[slots],
+                  'memory_rewards': memory.rewards[slots], 'memory_next_states': memory.next_states[slots],
+                  'memory_dones': memory.dones[slots]}
+        for prefix, variables in (('model', self.model.get_weights()), ('target', self.target_model.get_weights()),
+                                  ('optimizer', [v.numpy() for v in self.model.optimizer.variables])):
+            arrays.update({f"{prefix}_{i}": np.array(value) for i, value in enumerate(variables)})
+        state = {'episode': episode, 'epsilon': self.epsilon, 'train_steps': self.train_steps,
+                 'memory_position': memory.position, 'memory_size': memory.size, 'memory_total': memory.total,
+                 'random_state': RandomState(), 'extra': extra or {}}
+        checkpointer.save(arrays, state, full)
+        self.checkpoint_total = memory.total
+
+    def Restore(self, checkpointer):
+        """Load the last checkpoint into this agent and return (episode to resume from, extra), or (0, {})."""
+        chain = checkpointer.load()
+        if not chain:
+            return 0, {}
+        memory = self.memory
+        for arrays, _ in chain:
+            slots = arrays['memory_slots']
+            memory.states[slots] = arrays['memory_states']
+            memory.actions[slots] = arrays['memory_actions']
+            memory.rewards[slots] = arrays['memory_rewards']
+            memory.next_states[slots] = arrays['memory_next_states']
+            memory.dones[slots] = arrays['memory_dones']
+
+        arrays, state = chain[-1]
+        self.model.set_weights([arrays[f"model_{i}"] for i in range(len(self.model.get_weights()))])
+        self.target_model.set_weights([arrays[f"target_{i}"] for i in range(len(self.target_model.get_weights()))])
+        optimizer = self.model.optimizer
+        saved = sum(1 for key in arrays if key.startswith('optimizer_'))
+        if saved > len(optimizer.variables) and not optimizer.built:
+            optimizer.build(self.model.trainable_variables)  # Create the slot variables before assigning them
+        for i, variable in enumerate(optimizer.variables):
+            variable.assign(arrays[f"optimizer_{i}"])
+
+        self.epsilon = state['epsilon']
+        self.train_steps = state['train_steps']
+        memory.position, memory.size, memory.total = (state['memory_position'], state['memory_size'],
+                                                      state['memory_total'])
+        self.checkpoint_total = memory.total
+        SetRandomState(state['random_state'])
+        return state['episode'], state['extra']
+
+    def export_numpy(self, path):
+        """Write the network weights to a .npz file that NumpyDQNPolicy can load without TensorFlow."""
+        weights = self.model.get_weights()
+        np.savez(path, **{f"w{i}": w for i, w in enumerate(weights)})
+
+
+def NumpyWeightsPath(name):
+    """Return the .npz path DQNAgent.save writes next to the Keras weights file name."""
+    base = name[:-len('.weights.h5')] if name.endswith('.weights.h5') else os.path.splitext(name)[0]
+    return base + '.npz'
+
+
+class NumpyDQNPolicy:
+    """Pure-NumPy forward pass of the DQN MLP for serving moves without TensorFlow.
+
+    Weights are the kernel/bias pairs of the Dense layers, in order, as written
+    by DQNAgent.export_numpy; hidden layers use ReLU and the output is linear.
+    """
+
+    def __init__(self, weights):
+        self.layers = [(np.asarray(weights[i], dtype=np.float32), np.asarray(weights[i + 1], dtype=np.float32))
+                       for i in range(0, len(weights), 2)]
 
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls([data[f"w{i}"] for i in range(len(data.files))])
 
-def TrainDQNAgent(player_color, EPISODES, board, make_plot=True):
+    @classmethod
+    def FromAgent(cls, agent):
+        return cls(agent.model.get_weights())
+
+    def predict(self, states):
+        """Return Q-values for a (N, state_size) or (state_size,) array of states."""
+        x = np.asarray(states, dtype=np.float32)
+        for kernel, bias in self.layers[:-1]:
+            x = np.maximum(x @ kernel + bias, 0.0)
+        kernel, bias = self.layers[-1]
+        return x @ kernel + bias
+
+    def act(self, state, legal=None):
+        """Return the greedy action for state, restricted to the legal columns if a mask is given."""
+        q_values = self.predict(np.ravel(state))
+        if legal is not None:
+            q_values = np.where(legal, q_values, -np.inf)
+        return int(np.argmax(q_values))
+
+
+class VectorCollector:
+    """Plays num_envs games at once from board: the agent moves, then a random opponent replies.
+
+    Every step chooses all agent moves with one batched forward pass over legal
+    columns only and stores one transition per unfinished game.
+    """
+
+    def __init__(self, agent, player, board, num_envs):
+        self.agent = agent
+        self.player = player
+        self.env = VectorBoard(num_envs, board.rows, board.cols, first_player=player, auto_reset=False, start=board)
+        self.episode_rewards = []  # Total reward of every finished episode, in finishing order
+
+    def step(self):
+        env = self.env
+        states = env.states()
+        actions = self.agent.act_batch(states, env.legal_moves())
+        winner, agent_done = env.step(actions)
+        rewards = np.where(winner == self.player, 10.0, 0.0)
+
+        # The opponent replies on every game the agent's move did not finish
+        winner, opponent_done = env.step(env.random_actions())
+        rewards = np.where(winner == 3 - self.player, -10.0, rewards)
+        dones = agent_done | opponent_done
+
+        self.agent.memory.add_batch(states, actions, rewards, env.states(), dones)
+        self.episode_rewards.extend(rewards[dones].tolist())
+        env.reset(dones)
+        return int(np.count_nonzero(dones))
+
+
+def TrainDQNAgent(player_color, EPISODES, board, make_plot=False, num_envs=None, metrics=None, log_every=50,
+                  checkpoint=None, checkpoint_every=50, profiler=None):
+    """Train a DQN agent from board and return (agent, rewards, epsilon_values).
+
+    Per-episode reward, epsilon, length and states/sec go to metrics, a
+    MetricsSink that defaults to an in-memory ring; progress is printed every
+    log_every episodes. Plots are only drawn with make_plot=True.
+
+    With a checkpoint.Checkpointer, training resumes from its last
+    checkpoint and saves one every checkpoint_every episodes and at the end.
+    Serial training resumes exactly; vectorized training restarts the games
+    that were in progress when the checkpoint was taken.
+
+    With an enabled profiling.Profiler, the Keras predict and train calls
+    are counted too and each episode's counts go into its metrics record;
+    vectorized training adds each step's counts to the first episode it
+    finished.
+    """
+    sink = metrics if metrics is not None else RingMetricsSink()
+    start = time.perf_counter()
+    states_seen = 0
     state_size = ROWS * COLUMNS
     action_size = COLUMNS
     agent = DQNAgent(state_size, action_size)
@@ -75,57 +312,112 @@ def TrainDQNAgent(player_color, EPISODES, board, make_plot=True):
         raise ValueError(f"Invalid player color: {player_color}. Valid colors: 'R', 'Y', 'red', 'yellow'.")
     player = SYMBOLS[player_color]
 
-    for e in range(EPISODES):
-        current_board = board.copy()
-        total_reward = 0
-        done = False
-
-        while not done:
-            state = np.reshape(current_board.StateToKey(), [1, state_size])
-            action = agent.act(state)
-
-            if current_board.board[0][action] != 'O':
-                reward = -10
-                done = True
-            else:
-                row = current_board.AvailableRowInColumn(action)
-                if row == -1:
+    first = 0
+    if checkpoint is not None:
+        first, extra = agent.Restore(checkpoint)
+        rewards, epsilon_values = extra.get('rewards', []), extra.get('epsilon_values', [])
+        if first:
+            print(f"Resuming from episode {first}.")
+
+    profiling = profiler is not None and profiler.enabled
+    if profiling:
+        for model, name, label in ((agent.model, 'predict', 'model_predicts'),
+                                   (agent.model, 'predict_on_batch', 'model_predicts'),
+                                   (agent.model, 'train_on_batch', 'model_fits'),
+                                   (agent.target_model, 'predict_on_batch', 'target_predicts')):
+            profiler.watch(model, name, label)
+
+    def profile():
+        return profiler.summary('episode') if profiling else {}
+
+    def save(episode):
+        agent.Checkpoint(checkpoint, episode, {'rewards': [float(r) for r in rewards[:episode]],
+                                               'epsilon_values': [float(e) for e in epsilon_values[:episode]]})
+
+    if num_envs:
+        # Vectorized collection: one replay step per batch of num_envs moves
+        collector = VectorCollector(agent, player, board, num_envs)
+        collector.episode_rewards = list(rewards)
+        rewards = collector.episode_rewards
+        while len(collector.episode_rewards) < EPISODES:
+            finished = collector.step()
+            agent.replay(batch_size)
+            states_seen += num_envs
+            elapsed = time.perf_counter() - start
+            for e in range(len(epsilon_values), min(len(collector.episode_rewards), EPISODES)):
+                sink.record(episode=e, reward=collector.episode_rewards[e], epsilon=agent.epsilon,
+                            states_per_sec=states_seen / elapsed, **profile())
+            epsilon_values.extend([agent.epsilon] * finished)
+            done_episodes = min(len(epsilon_values), EPISODES)
+            if checkpoint is not None and done_episodes // checkpoint_every > (done_episodes - finished) // checkpoint_every:
+                save(done_episodes)
+        rewards = collector.episode_rewards[:EPISODES]
+        epsilon_values = epsilon_values[:EPISODES]
+        print(f"Episodes: {EPISODES}, Mean reward: {np.mean(rewards):.2f}, Epsilon: {agent.epsilon:.2f}")
+    else:
+        for e in range(first, EPISODES):
+            current_board = board.copy()
+            total_reward = 0
+            length = 0
+            done = False
+
+            while not done:
+                state = np.reshape(current_board.StateToGrid(), [1, state_size])
+                action = agent.act(state)
+
+                if current_board.board[0][action] != 'O':
                     reward = -10
                     done = True
                 else:
-                    current_board.board[row][action] = INT_TO_SYMBOL[player]
-                    if current_board.CheckWin(INT_TO_SYMBOL[player]):
-                        reward = 10
+                    row = current_board.AvailableRowInColumn(action)
+                    if row == -1:
+                        reward = -10
                         done = True
                     else:
-                        avail_cols = current_board.AvailableColumns()
-                        if not avail_cols:
-                            reward = 0
+                        if current_board.play(action, INT_TO_SYMBOL[player]):
+                            reward = 10
                             done = True
                         else:
-                            opp_action = random.choice(avail_cols)
-                            opp_row = current_board.AvailableRowInColumn(opp_action)
-                            current_board.board[opp_row][opp_action] = INT_TO_SYMBOL[3 - player]
-                            if current_board.CheckWin(INT_TO_SYMBOL[3 - player]):
-                                reward = -10
+                            avail_cols = current_board.AvailableColumns()
+                            if not avail_cols:
+                                reward = 0
                                 done = True
                             else:
-                                reward = 0
+                                opp_action = random.choice(avail_cols)
+                                if current_board.play(opp_action, INT_TO_SYMBOL[3 - player]):
+                                    reward = -10
+                                    done = True
+                                else:
+                                    reward = 0
 
-            next_state = np.reshape(current_board.StateToKey(), [1, state_size])
-            agent.remember(state, action, reward, next_state, done)
-            total_reward += reward
+                next_state = np.reshape(current_board.StateToGrid(), [1, state_size])
+                agent.remember(state, action, reward, next_state, done)
+                total_reward += reward
+                length += 1
 
-            if done:
-                break
+                if done:
+                    break
 
-            agent.replay(batch_size)
+                agent.replay(batch_size)
+
+            rewards.append(total_reward)
+            epsilon_values.append(agent.epsilon)
+            states_seen += length
+            sink.record(episode=e, reward=total_reward, epsilon=agent.epsilon, length=length,
+                        states_per_sec=states_seen / (time.perf_counter() - start), **profile())
+            if (e + 1) % log_every == 0 or e + 1 == EPISODES:
+                print(f"Episode: {e + 1}/{EPISODES}, Reward: {total_reward}, Epsilon: {agent.epsilon:.2f}")
+            if checkpoint is not None and (e + 1) % checkpoint_every == 0:
+                save(e + 1)
 
-        rewards.append(total_reward)
-        epsilon_values.append(agent.epsilon)
-        print(f"Episode: {e + 1}/{EPISODES}, Reward: {total_reward}, Epsilon: {agent.epsilon:.2f}")
+    if checkpoint is not None:
+        if EPISODES > first and EPISODES % checkpoint_every:
+            save(EPISODES)
+        checkpoint.flush()
 
     if make_plot:
+        import matplotlib.pyplot as plt  # type: ignore
+
         plt.plot(rewards)
         plt.ylabel('Reward')
         plt.xlabel('Episode')
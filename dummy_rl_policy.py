@@ -4,3 +4,6 @@ from board import *
 class Dummy_RL_Policy:
     def predict(self, board):
         return np.random.rand(board.cols)
+
+    def predict_batch(self, boards):
+        return np.random.rand(len(boards), boards[0].cols)
@@ -1,3 +1,22 @@
+import json
+from board import SYMBOLS
+
+
+class InvalidPosition:
+    """Stands in for the board of an entry read_positions could not parse; str() gives the reason."""
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def _IsRow(line):
+    """Return True if line is a row of board cells ('O', 'R' and 'Y' in either case)."""
+    return all(cell.lower() in SYMBOLS for cell in line)
+
+
 class File_Reader:
     def __init__(self, file_path):
         self.file_path = file_path
@@ -17,3 +36,55 @@ class File_Reader:
         except Exception as e:
             print(f"An error occurred: {e}")
             return None
+
+    def read_positions(self):
+        """Yield (algorithm_type, player_color, board) for every position in the file, one at a time.
+
+        Accepts the text format of read_file repeated, or JSONL with one
+        {"algorithm", "player", "board"} object per line, where board is a
+        list of row strings or lists; the two may be mixed. A text block ends
+        at a blank line, a JSON line, or the next algorithm line (any line
+        after the color that is not a row of board cells). Boards may have
+        any size, but every text block must have as many rows as the first
+        one. A malformed entry is yielded with an InvalidPosition naming its
+        line in place of the board, and reading resumes at the next entry,
+        so one bad block does not end or shift a long stream.
+        """
+        with open(self.file_path, 'r') as file:
+            block, start, rows = [], None, None
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+                # Anything but another board row closes the open block
+                if block and (not line or line.startswith('{') or (len(block) >= 2 and not _IsRow(line))):
+                    position, rows = self._parse_block(block, start, rows)
+                    yield position
+                    block = []
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    yield self._parse_json(line, number)
+                    continue
+                if not block:
+                    start = number
+                block.append(line)
+            if block:
+                yield self._parse_block(block, start, rows)[0]
+
+    def _parse_block(self, block, start, rows):
+        """Return the position of one text block and the row count later blocks must match."""
+        player = block[1] if len(block) > 1 else None
+        if len(block) < 3:
+            return (block[0], player, InvalidPosition(
+                f"Incomplete position starting at line {start} of {self.file_path}.")), rows
+        if rows is not None and len(block) - 2 != rows:
+            return (block[0], player, InvalidPosition(
+                f"Position starting at line {start} of {self.file_path} has {len(block) - 2} rows, "
+                f"expected {rows}.")), rows
+        return (block[0], player, [list(row) for row in block[2:]]), len(block) - 2
+
+    def _parse_json(self, line, number):
+        try:
+            record = json.loads(line)
+            return record.get('algorithm'), record.get('player'), [list(row) for row in record['board']]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return None, None, InvalidPosition(f"Invalid position on line {number} of {self.file_path}: {e}")
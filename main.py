@@ -5,15 +5,38 @@ from uct_tree import uct_tree
 from uniform_random import Uniform_Random
 from dummy_rl_policy import Dummy_RL_Policy
 from q_agent import QAgent
+from q_table import MappedQTable
+from solver import Solver
+from opening_book import OpeningBook
 from uct_node import UCT_Node
 import numpy as np  # type: ignore
-import matplotlib.pyplot as plt  # type: ignore
 from dqn_agent import *
+from metrics import FileMetricsSink
+from profiling import Profiler, FormatSummary
 
 class Main:
     SYMBOLS = {'B': 1, 'R': 2}  # Example mapping for colors
     num_simulations = 100  # Default number of simulations
     game_loop = True  # Flag to control the game loop
+    uct = None  # UCT tree reused across moves
+    uct_parallel = None  # None, "root" or "leaf" parallel UCT search
+    uct_workers = None  # Worker processes for parallel UCT (defaults to all cores)
+    uct_time_budget_ms = None  # Per-move UCT deadline; None runs num_simulations
+    uct_eval_batch_size = None  # Leaves evaluated per rl_policy.predict_batch call in UCT
+    uct_rollout_policy = None  # "rl" (default), "random", "center", "winblock" or "table:<book path>"
+    dqn_weights = None  # .npz weights from DQNAgent.save; when set, DQN moves skip training
+    q_table_path = None  # Memory-mapped Q-table file to warm-start from and keep learning into
+    q_agent = None  # Q-learning agent kept across moves
+    solver = None  # Alpha-beta solver; its transposition table is kept across moves
+    solver_depth = None  # Maximum plies for AB; None searches to the end of the game
+    solver_time_budget_ms = 2000  # Per-move AB deadline; None searches until solved or solver_depth
+    opening_book_path = None  # Book file from opening_book.py; its moves are played before any algorithm runs
+    opening_book = None
+    metrics_path = None  # JSONL/CSV file for training metrics; plot it later with metrics.py
+    metrics = None
+    profile = False  # Count and time hot-path calls per move; "P" at the prompt dumps cProfile/tracemalloc
+    profile_dir = "profiles"  # Where profile dumps are written
+    profiler = None
 
     def main(self):
         print("Main class initialized")
@@ -33,11 +56,24 @@ class Main:
         self.board.board = board_data
         self.board.PrintBoard()
 
+        if self.metrics_path is not None:
+            self.metrics = FileMetricsSink(self.metrics_path)
+        if self.opening_book_path is not None:
+            self.opening_book = OpeningBook(self.opening_book_path)
+        if self.profile:
+            self.profiler = Profiler(self.profile_dir, cprofile=True, trace_allocations=True).enable()
+            self.profiler.dump_on_signal()
+            print(f"Profiling enabled; enter P to write a profile to {self.profile_dir}/")
+
         # Start game loop
         while self.game_loop:
-            algorithm_type = input("Enter algorithm type (UR, UCT, QL, DQN, C to quit): ").strip()
+            algorithm_type = input("Enter algorithm type (UR, UCT, QL, DQN, AB, C to quit): ").strip()
+
+            if algorithm_type == "P" and self.profiler is not None:
+                print(f"Profile written to {', '.join(self.profiler.dump('main'))}")
+                continue
 
-            if algorithm_type not in ["UR", "UCT", "QL", "DQN", "C"]:
+            if algorithm_type not in ["UR", "UCT", "QL", "DQN", "AB", "C"]:
                 print(f"Invalid input: {algorithm_type}. Please try again.")
                 continue
 
@@ -46,22 +82,39 @@ class Main:
                 break
 
             print(f"\n--- Running {algorithm_type} Algorithm ---")
-            if algorithm_type == "UR":
+            book_move = self.opening_book.Lookup(self.board, player_color) if self.opening_book else None
+            if book_move is not None:
+                self.board.play(book_move[0], player_color)
+                print(f"Opening book selected column: {book_move[0] + 1}")
+
+            elif algorithm_type == "UR":
                 Uniform_Random.UniformRandom(player_color, self.board, output_type="verbose")
 
             elif algorithm_type == "UCT":
-                rl_policy = Dummy_RL_Policy()
-                uct = uct_tree(player_color, rl_policy, self.board, num_simulations=self.num_simulations)
-                move = uct.search(self.board)
+                # Keep the tree between moves so its statistics carry over
+                if self.uct is None:
+                    rl_policy = Dummy_RL_Policy()
+                    self.uct = uct_tree(player_color, rl_policy, self.board, num_simulations=self.num_simulations,
+                                        parallel=self.uct_parallel, workers=self.uct_workers,
+                                        eval_batch_size=self.uct_eval_batch_size,
+                                        rollout_policy=self.uct_rollout_policy)
+                move = self.uct.search(self.board, time_budget_ms=self.uct_time_budget_ms)
+                print(f"UCT ran {self.uct.stats['simulations']} simulations in {self.uct.stats['elapsed']:.3f}s "
+                      f"({self.uct.stats['simulations_per_second']:.0f}/s)")
+                if self.profiler is not None:
+                    self.profiler.add('transposition_hits', self.uct.stats['transpositions'])
                 row = self.board.AvailableRowInColumn(move)
                 if row != -1:
                     self.board.board[row][move] = player_color
                 print(f"UCT selected column: {move + 1}")
 
             elif algorithm_type == "QL":
-                rl_policy = Dummy_RL_Policy()
-                q_agent = QAgent()
-                q_agent.TrainQLearning(player_color, 1, self.board, num_simulations=self.num_simulations, output_type="verbose")
+                if self.q_agent is None:
+                    q_table = MappedQTable(self.q_table_path) if self.q_table_path else None
+                    self.q_agent = QAgent(Q_table=q_table)
+                q_agent = self.q_agent
+                q_agent.TrainQLearning(player_color, 1, self.board, num_simulations=self.num_simulations, output_type="verbose",
+                                       metrics=self.metrics, profiler=self.profiler)
                 _, selected_column = q_agent.QLearningMove(player_color, self.board)
                 row = self.board.AvailableRowInColumn(selected_column)
                 if row != -1:
@@ -69,21 +122,34 @@ class Main:
                 print(f"Q-Learning selected column: {selected_column + 1}")
 
             elif algorithm_type == "DQN":
-                print(f"Training DQN Agent for {self.num_simulations} episodes...")
-                agent, rewards, epsilon_values = TrainDQNAgent(player_color, self.num_simulations, self.board)
-                state = np.reshape(self.board.board, [1, len(self.board.board) * len(self.board.board[0])])
-                action = agent.act(state)
-                row = self.board.AvailableRowInColumn(action)
-                player_num = self.SYMBOLS[player_color]
-                if row != -1:
-                    self.board.board[row][action] = player_num
+                if self.dqn_weights is not None:
+                    # Serve from exported weights; TensorFlow is never imported
+                    policy = NumpyDQNPolicy.load(self.dqn_weights)
+                else:
+                    print(f"Training DQN Agent for {self.num_simulations} episodes...")
+                    agent, rewards, epsilon_values = TrainDQNAgent(player_color, self.num_simulations, self.board,
+                                                                   metrics=self.metrics, profiler=self.profiler)
+                    policy = NumpyDQNPolicy.FromAgent(agent)
+                state = np.reshape(self.board.StateToGrid(), [1, self.board.rows * self.board.cols])
+                legal = [col in self.board.AvailableColumns() for col in range(self.board.cols)]
+                action = policy.act(state, legal)
+                self.board.play(action, player_color)
                 print(f"DQN selected column: {action + 1}")
 
-                plt.plot(agent.epsilon_list)
-                plt.ylabel('Epsilon')
-                plt.xlabel('Episode')
-                plt.title('DQN Agent Training Epsilon')
-                plt.show()
+            elif algorithm_type == "AB":
+                if self.solver is None:
+                    self.solver = Solver(self.board.rows, self.board.cols)
+                move = self.solver.search(self.board, player_color, depth=self.solver_depth,
+                                         time_budget_ms=self.solver_time_budget_ms)
+                stats = self.solver.stats
+                print(f"Alpha-beta searched {stats['nodes']} nodes to depth {stats['depth']} in {stats['elapsed']:.3f}s "
+                      f"(score {stats['score']}{', solved' if stats['solved'] else ''})")
+                if move is not None:
+                    self.board.play(move, player_color)
+                    print(f"Alpha-beta selected column: {move + 1}")
+
+            if self.profiler is not None:
+                print(f"Profile: {FormatSummary(self.profiler.summary('move'))}")
 
             # Print updated board
             print("Updated board:")
@@ -97,6 +163,11 @@ class Main:
                 print("Game Over! It's a draw.")
                 self.game_loop = False
 
+        if self.metrics is not None:
+            self.metrics.close()
+        if self.profiler is not None:
+            self.profiler.disable()
+
 # Run the main function
 if __name__ == "__main__":
     runner = Main()
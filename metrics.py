@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MetricsSink:
+    """Receives training metrics as flat dicts, one call per episode or evaluation."""
+
+    def record(self, **metrics):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RingMetricsSink(MetricsSink):
+    """Keeps the most recent maxlen records in memory."""
+
+    def __init__(self, maxlen=10000):
+        self.buffer = deque(maxlen=maxlen)
+
+    def record(self, **metrics):
+        self.buffer.append(metrics)
+
+    def records(self):
+        return list(self.buffer)
+
+
+class FileMetricsSink(MetricsSink):
+    """Appends records to a JSONL or CSV file (chosen by extension) from a background thread.
+
+    record() only enqueues, so a slow disk never stalls the training loop.
+    CSV columns are the union of the keys seen so far: when a record brings
+    a new key (the first evaluation or profiler record), the file is
+    rewritten once with the wider header, and missing values are empty.
+    """
+
+    def __init__(self, path, maxsize=100000):
+        self.path = path
+        self.format = 'csv' if path.endswith('.csv') else 'jsonl'
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self._Write, daemon=True)
+        self.thread.start()
+
+    def record(self, **metrics):
+        self.queue.put(metrics)
+
+    def _Write(self):
+        fieldnames = self._ReadHeader() if self.format == 'csv' else None
+        file = open(self.path, 'a', newline='')
+        writer = csv.DictWriter(file, fieldnames=fieldnames) if fieldnames else None
+        try:
+            while True:
+                metrics = self.queue.get()
+                if metrics is None:
+                    break
+                if self.format == 'jsonl':
+                    file.write(json.dumps(metrics) + '\n')
+                else:
+                    new = [key for key in metrics if key not in (fieldnames or ())]
+                    if writer is None or new:
+                        fieldnames = (fieldnames or []) + new
+                        file.close()
+                        self._Rewrite(fieldnames)
+                        file = open(self.path, 'a', newline='')
+                        writer = csv.DictWriter(file, fieldnames=fieldnames)
+                    writer.writerow(metrics)
+                if self.queue.empty():
+                    file.flush()
+        finally:
+            file.close()
+
+    def _ReadHeader(self):
+        """Return the columns of an existing CSV file, or None if it is empty or missing."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        with open(self.path, newline='') as file:
+            return next(csv.reader(file), None)
+
+    def _Rewrite(self, fieldnames):
+        """Rewrite the CSV file under the header fieldnames, keeping the rows written so far."""
+        rows = []
+        if os.path.exists(self.path):
+            with open(self.path, newline='') as file:
+                rows = list(csv.DictReader(file))
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        """Write out everything queued so far and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class BackgroundEvaluator:
+    """Runs evaluation calls on a worker thread and records their results in a sink."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def submit(self, evaluate, episode, name='win_rate'):
+        """Run evaluate() in the background and record {episode, name: result} when it finishes."""
+        def run():
+            result = evaluate()
+            self.sink.record(episode=episode, **{name: result})
+            return episode, result
+        future = self.executor.submit(run)
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """Wait for pending evaluations and return their (episode, result) pairs in submission order."""
+        self.executor.shutdown(wait=True)
+        return [future.result() for future in self.futures]
+
+
+def ReadMetrics(path):
+    """Load the records written by FileMetricsSink."""
+    with open(path, newline='') as file:
+        if path.endswith('.csv'):
+            return [{key: _Number(value) for key, value in row.items()} for row in csv.DictReader(file)]
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def _Number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def PlotMetrics(records, y, x='episode', output=None):
+    """Plot metric y against x from records offline; save to output or show the figure."""
+    import matplotlib  # type: ignore
+    if output is not None:
+        matplotlib.use('Agg')  # Headless: render straight to the file
+    import matplotlib.pyplot as plt  # type: ignore
+
+    points = [(record[x], record[y]) for record in records if record.get(y) not in (None, '')]
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.plot([p[0] for p in points], [p[1] for p in points], marker='o' if len(points) < 100 else None)
+    ax.set_xlabel(x.replace('_', ' ').title())
+    ax.set_ylabel(y.replace('_', ' ').title())
+    ax.grid(True)
+    if output is not None:
+        fig.savefig(output)
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    # Usage: python metrics.py METRICS_FILE METRIC [OUTPUT_IMAGE]
+    if len(sys.argv) < 3 or not os.path.exists(sys.argv[1]):
+        print("Usage: python metrics.py METRICS_FILE METRIC [OUTPUT_IMAGE]")
+        sys.exit(1)
+    PlotMetrics(ReadMetrics(sys.argv[1]), sys.argv[2], output=sys.argv[3] if len(sys.argv) > 3 else None)
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np  # type: ignore
+import batch_moves
+from agents import HasBatchedMoves, ParseSpec
+
+
+def _WarmWorker(specs, book):
+    """Build the agents and open the book once per worker process, before any request arrives."""
+    for spec in specs.values():
+        batch_moves._Agent(spec)
+    if book:
+        batch_moves._Book(book)
+
+
+def _ServeBatch(args):
+    positions, specs, book = args
+    return batch_moves.SelectMoves(positions, specs, book)
+
+
+class MoveServer:
+    """Serves moves over a JSON-lines protocol from warm agents kept in worker processes.
+
+    A request is {"id": ..., "algorithm": "AB", "player": "R", "board": [...]}
+    and its response echoes the id with the chosen "move", the request's
+    "latency_ms" and the "batch_size" it was evaluated in; {"cmd": "stats"}
+    returns latency percentiles. Requests that arrive within max_delay_ms of
+    each other are collected, up to max_batch. Those for an agent with
+    batched inference (a DQN agent) are coalesced into one executor call
+    per agent, so it scores them in a single forward pass. Every other
+    request goes to the pool on its own, so CPU-bound searches such as AB
+    and UCT run on all workers at once instead of one after another.
+    """
+
+    def __init__(self, specs=None, book=None, workers=None, max_batch=32, max_delay_ms=2.0):
+        self.specs = specs or {}
+        self.book = book
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_WarmWorker,
+                                            initargs=(self.specs, book))
+        self.queue = None
+        self.batcher = None
+        self.slots = None  # Bounds the batches handed to the executor at once
+        self.latencies = deque(maxlen=10000)  # Most recent request latencies in ms
+        self.batch_sizes = deque(maxlen=10000)
+        self.requests = 0
+
+    def _Start(self):
+        if self.batcher is None:
+            self.queue = asyncio.Queue()
+            self.slots = asyncio.Semaphore(2 * self.workers)
+            self.batcher = asyncio.create_task(self._BatchLoop())
+
+    async def request(self, request):
+        """Return the response dict for one request dict."""
+        start = time.perf_counter()
+        if request.get('cmd') == 'stats':
+            return {'id': request.get('id'), **self.Stats()}
+        self._Start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((request.get('algorithm'), request.get('player'), request.get('board')), future))
+        result, batch_size = await future
+        latency = (time.perf_counter() - start) * 1000
+        self.latencies.append(latency)
+        self.requests += 1
+        return {'id': request.get('id'), **result, 'latency_ms': latency, 'batch_size': batch_size}
+
+    async def _BatchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            for group in self._Split(batch):
+                await self.slots.acquire()
+                asyncio.create_task(self._RunBatch(group))
+
+    def _Split(self, batch):
+        """Return the executor calls for batch: one per batched agent, one per other request."""
+        groups = {}
+        singles = []
+        for item in batch:
+            spec = self._BatchedSpec(item[0][0])
+            if spec is None:
+                singles.append([item])
+            else:
+                groups.setdefault(spec, []).append(item)
+        return list(groups.values()) + singles
+
+    def _BatchedSpec(self, algorithm):
+        """Return the agent spec for algorithm if its requests are coalesced, else None."""
+        if algorithm is not None and not isinstance(algorithm, str):
+            return None  # Invalid; the worker reports the error
+        algorithm = (algorithm or batch_moves.DEFAULT_ALGORITHM).strip().upper()
+        spec = self.specs.get(algorithm, algorithm)
+        try:
+            return spec if HasBatchedMoves(spec) else None
+        except ValueError:
+            return None
+
+    async def _RunBatch(self, batch):
+        try:
+            positions = [position for position, _ in batch]
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _ServeBatch, (positions, self.specs, self.book))
+        except Exception as e:  # A crashed worker fails its requests, not the server
+            results = [{'move': None, 'error': f"{type(e).__name__}: {e}"}] * len(batch)
+        finally:
+            self.slots.release()
+        self.batch_sizes.append(len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result((result, len(batch)))
+
+    def Stats(self):
+        """Return request count, latency percentiles (ms) and mean batch size."""
+        stats = {'requests': self.requests, 'workers': self.workers}
+        if self.latencies:
+            latencies = np.array(self.latencies)
+            stats.update({f"latency_p{p}_ms": float(np.percentile(latencies, p)) for p in (50, 90, 99)})
+            stats['mean_batch_size'] = float(np.mean(self.batch_sizes))
+        return stats
+
+    async def _Respond(self, line, write):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            response = await self.request(request)
+        except ValueError as e:
+            response = {'error': f"Invalid request: {e}"}
+        write(json.dumps(response) + '\n')
+
+    async def _Serve(self, readline, write, drain):
+        tasks = set()
+        while line := await readline():
+            if line.strip():
+                task = asyncio.create_task(self._Respond(line, write))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await drain()
+        await asyncio.gather(*tasks)
+
+    async def _HandleClient(self, reader, writer):
+        try:
+            await self._Serve(reader.readline, lambda text: writer.write(text.encode()), writer.drain)
+        finally:
+            writer.close()
+
+    async def ServeTCP(self, host='127.0.0.1', port=8765):
+        """Accept connections on host:port until cancelled; each line on a connection is one request."""
+        server = await asyncio.start_server(self._HandleClient, host, port)
+        print(f"Move server listening on {host}:{port} with {self.workers} workers", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def ServeStdio(self):
+        """Answer requests read from stdin on stdout until stdin closes."""
+        loop = asyncio.get_running_loop()
+
+        async def readline():
+            # stdin may be a file or a terminal, so read it on a thread rather than as a pipe
+            return await loop.run_in_executor(None, sys.stdin.readline)
+
+        def write(text):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        async def drain():
+            pass
+
+        await self._Serve(readline, write, drain)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+        self.executor.shutdown()
+
+
+async def _Main(args):
+    server = MoveServer({ParseSpec(spec)[0]: spec for spec in args.agent}, args.book, args.workers,
+                        args.max_batch, args.max_delay_ms)
+    try:
+        if args.stdio:
+            await server.ServeStdio()
+        else:
+            await server.ServeTCP(args.host, args.port)
+    finally:
+        print(json.dumps(server.Stats()), file=sys.stderr)
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Connect Four moves from warm agents.")
+    parser.add_argument("--agent", action="append", default=[],
+                        help="agent spec to load for its type, e.g. DQN:dqn_weights=w.npz (repeatable)")
+    parser.add_argument("--book", default=None, help="opening book consulted before any agent")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0, help="how long to wait to fill a batch")
+    parser.add_argument("--stdio", action="store_true", help="read requests from stdin instead of a socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    try:
+        asyncio.run(_Main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,141 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np  # type: ignore
+from board import *
+from solver import Solver
+
+MAGIC = b'C4OB'
+VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('rows', '<u4'), ('cols', '<u4'),
+                         ('plies', '<u4'), ('pad', '<u4'), ('count', '<u8')])
+RECORD_DTYPE = np.dtype([('key', '<u8'), ('move', 'u1'), ('score', 'i1')])
+
+
+def BookKey(board, player):
+    """Return (key, mirrored) for player to move on board; mirror images share a key."""
+    key, mirrored = board.CanonicalKey()
+    return key ^ (TURN_KEY if player == 'Y' else 0), mirrored
+
+
+def EnumeratePositions(max_plies, rows=ROWS, cols=COLUMNS):
+    """Return one move list per distinct unfinished position reachable in at most max_plies plies."""
+    positions, seen = [], set()
+    frontier = [[]]
+    for ply in range(max_plies + 1):
+        next_frontier = []
+        for moves in frontier:
+            board = Board(rows, cols)
+            for col in moves:
+                board.play(col)
+            key, _ = BookKey(board, 'R' if ply % 2 == 0 else 'Y')
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append(moves)
+            if ply == max_plies:
+                continue
+            for col in board.AvailableColumns():
+                if not board.play(col):
+                    next_frontier.append(moves + [col])
+                board.undo(col)
+        frontier = next_frontier
+    return positions
+
+
+def _SolveWorker(args):
+    """Search a chunk of positions and return (key, canonical move, score) rows."""
+    positions, rows, cols, depth, time_budget_ms = args
+    solver = Solver(rows, cols)
+    results = []
+    for moves in positions:
+        board = Board(rows, cols)
+        for col in moves:
+            board.play(col)
+        player = 'R' if len(moves) % 2 == 0 else 'Y'
+        move = solver.search(board, player, depth=depth, time_budget_ms=time_budget_ms)
+        if move is None:
+            continue
+        key, mirrored = BookKey(board, player)
+        results.append((key, board.MirrorColumn(move) if mirrored else move, solver.stats['score']))
+    return results
+
+
+def BuildOpeningBook(path, max_plies=4, rows=ROWS, cols=COLUMNS, depth=10, time_budget_ms=None,
+                     workers=None, chunk_size=16):
+    """Search every position up to max_plies plies across worker processes and write the book to path."""
+    start = time.perf_counter()
+    positions = EnumeratePositions(max_plies, rows, cols)
+    print(f"Searching {len(positions)} positions up to ply {max_plies}...")
+    tasks = [(positions[i:i + chunk_size], rows, cols, depth, time_budget_ms)
+             for i in range(0, len(positions), chunk_size)]
+    records = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for chunk in executor.map(_SolveWorker, tasks):
+            records.extend(chunk)
+
+    table = np.array(records, dtype=RECORD_DTYPE)
+    table.sort(order='key')
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (MAGIC, VERSION, rows, cols, max_plies, 0, len(table))
+    with open(path, 'wb') as file:
+        file.write(header.tobytes())
+        file.write(table.tobytes())
+    print(f"Wrote {len(table)} positions to {path} in {time.perf_counter() - start:.1f}s")
+    return OpeningBook(path)
+
+
+class OpeningBook:
+    """Best moves for opening positions, read from a sorted binary file by binary search.
+
+    The records are memory-mapped, so opening a book is cheap and several
+    processes can share one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not an opening book file.")
+        self.rows = int(header['rows'][0])
+        self.cols = int(header['cols'][0])
+        self.plies = int(header['plies'][0])
+        count = int(header['count'][0])
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize,
+                                 shape=(count,)) if count else np.zeros(0, dtype=RECORD_DTYPE)
+        self.keys = self.records['key']
+
+    def __len__(self):
+        return len(self.records)
+
+    def _Find(self, key):
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def Lookup(self, board, player):
+        """Return (column, score) from the book for player to move on board, or None if it is not there."""
+        if (board.rows, board.cols) != (self.rows, self.cols) or sum(board.heights) > self.plies:
+            return None
+        key, mirrored = BookKey(board, player)
+        index = self._Find(key)
+        if index is None:
+            return None
+        move = int(self.records['move'][index])
+        return (board.MirrorColumn(move) if mirrored else move), int(self.records['score'][index])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Connect Four opening book.")
+    parser.add_argument("path", help="book file to write")
+    parser.add_argument("--plies", type=int, default=4, help="include every position up to this many plies")
+    parser.add_argument("--depth", type=int, default=10, help="search depth per position (0 = to the end)")
+    parser.add_argument("--time-budget-ms", type=float, default=None, help="search time per position")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--cols", type=int, default=COLUMNS)
+    args = parser.parse_args()
+    BuildOpeningBook(args.path, args.plies, args.rows, args.cols, args.depth or None, args.time_budget_ms,
+                     args.workers)
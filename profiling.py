@@ -0,0 +1,196 @@
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import signal
+import sys
+import time
+import tracemalloc
+
+# Hot paths counted by default: (module, class, method, label). Methods sharing a label are summed.
+DEFAULT_TARGETS = (
+    ('board', 'Board', 'CheckWin', 'win_checks'),
+    ('board', 'Board', 'WinningColumns', 'threat_checks'),
+    ('board', 'Board', 'copy', 'board_copies'),
+    ('uct_tree', 'uct_tree', 'select_node', 'selections'),
+    ('uct_store', 'NodeStore', 'add_child', 'nodes_expanded'),
+    ('uct_store', 'ArrayNodeStore', 'add_child', 'nodes_expanded'),
+    ('uct_tree', 'uct_tree', 'rollout', 'rollouts'),
+    ('uct_tree', 'uct_tree', 'batch_rollout', 'rollout_batches'),
+    ('dummy_rl_policy', 'Dummy_RL_Policy', 'predict', 'policy_predicts'),
+    ('dummy_rl_policy', 'Dummy_RL_Policy', 'predict_batch', 'policy_batch_predicts'),
+    ('dqn_agent', 'NumpyDQNPolicy', 'predict', 'policy_predicts'),
+    ('dqn_agent', 'DQNAgent', 'act', 'dqn_acts'),
+    ('dqn_agent', 'DQNAgent', 'replay', 'dqn_replays'),
+    ('q_agent', 'QAgent', 'QLearningColumn', 'q_moves'),
+    ('solver', 'Solver', 'search', 'solver_searches'),
+)
+
+_MISSING = object()
+
+
+class Profiler:
+    """Opt-in call counters and timers for the hot paths, with cProfile/tracemalloc dumps on demand.
+
+    Nothing is wrapped until enable(), which replaces the DEFAULT_TARGETS
+    methods with counting wrappers, and disable() puts the originals back,
+    so a disabled profiler costs nothing. Only modules already imported are
+    patched, and only calls in this process are seen: parallel UCT workers
+    are not counted. summary(scope) returns the counts and milliseconds
+    since the previous summary of the same scope, e.g. per search or per
+    episode.
+    """
+
+    def __init__(self, directory='profiles', cprofile=False, trace_allocations=False, targets=DEFAULT_TARGETS):
+        self.directory = directory
+        self.targets = targets
+        self.counts = {}
+        self.times = {}  # Inclusive seconds per label
+        self.marks = {}  # Scope -> (counts, times) at its last summary
+        self.patches = []  # (owner, name, original attribute or _MISSING)
+        self.profile = cProfile.Profile() if cprofile else None
+        self.trace_allocations = trace_allocations
+        self.enabled = False
+        self.dumps = 0
+
+    def enable(self):
+        if self.enabled:
+            return self
+        self.enabled = True
+        for module_name, class_name, method, label in self.targets:
+            owner = getattr(sys.modules.get(module_name), class_name, None)
+            if owner is not None and hasattr(owner, method):
+                self.watch(owner, method, label)
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def disable(self):
+        """Restore every wrapped method and stop cProfile and tracemalloc."""
+        if self.enabled:
+            self.enabled = False
+            if self.profile is not None:
+                self.profile.disable()
+            if self.trace_allocations and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        for owner, name, original in reversed(self.patches):
+            if original is _MISSING:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.patches = []
+
+    def watch(self, owner, name, label=None):
+        """Count and time calls to owner.name, a class or an instance such as a Keras model, until disable().
+
+        Watching an attribute that is already watched does nothing, so its
+        calls are never counted twice and disable() restores the original.
+        """
+        if any(patched is owner and patched_name == name for patched, patched_name, _ in self.patches):
+            return
+        label = label or name
+        method = getattr(owner, name)
+        counts, times = self.counts, self.times
+        counts.setdefault(label, 0)
+        times.setdefault(label, 0.0)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counts[label] += 1
+                times[label] += time.perf_counter() - start
+
+        self.patches.append((owner, name, vars(owner).get(name, _MISSING)))
+        setattr(owner, name, wrapper)
+
+    def add(self, label, count=1):
+        """Add to a counter that is not a call, such as transposition table hits."""
+        self.counts[label] = self.counts.get(label, 0) + count
+
+    def summary(self, scope='default'):
+        """Return {label: count, label_ms: time} accumulated since the last summary of scope.
+
+        With trace_allocations the traced memory now and its peak since the
+        last summary are included as alloc_kb and alloc_peak_kb.
+        """
+        counts, times = self.marks.get(scope, ({}, {}))
+        result = {}
+        for label, count in self.counts.items():
+            result[label] = count - counts.get(label, 0)
+            if label in self.times:
+                result[f"{label}_ms"] = (self.times[label] - times.get(label, 0.0)) * 1000
+        self.marks[scope] = (dict(self.counts), dict(self.times))
+        if self.trace_allocations and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result.update(alloc_kb=current / 1024, alloc_peak_kb=peak / 1024)
+        return result
+
+    def dump(self, tag='profile'):
+        """Write the cProfile stats, a tracemalloc snapshot and the counters under directory; return the paths."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.dumps += 1
+        base = os.path.join(self.directory, f"{tag}_{os.getpid()}_{self.dumps:03d}")
+        paths = []
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(base + '.prof')
+            if self.enabled:
+                self.profile.enable()
+            paths.append(base + '.prof')
+        if tracemalloc.is_tracing():
+            tracemalloc.take_snapshot().dump(base + '.tracemalloc')
+            paths.append(base + '.tracemalloc')
+        with open(base + '.json', 'w') as file:
+            json.dump({'counts': self.counts, 'ms': {label: t * 1000 for label, t in self.times.items()}},
+                      file, indent=1)
+        paths.append(base + '.json')
+        return paths
+
+    def dump_on_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """Dump whenever the process receives signum (kill -USR1 <pid>), for long training runs."""
+        if signum is not None:
+            signal.signal(signum, lambda *_: print(f"Profile written to {', '.join(self.dump('signal'))}"))
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+
+def FormatSummary(summary):
+    """Return a one-line 'label=count (ms)' rendering of a summary, skipping labels with no calls."""
+    parts = []
+    for label, value in summary.items():
+        if label.endswith('_ms') or label.startswith('alloc_') or not value:
+            continue
+        ms = summary.get(f"{label}_ms")
+        parts.append(f"{label}={value}" + (f" ({ms:.1f}ms)" if ms is not None else ""))
+    if 'alloc_peak_kb' in summary:
+        parts.append(f"alloc_peak={summary['alloc_peak_kb']:.0f}KB")
+    return ', '.join(parts) or 'no profiled calls'
+
+
+def PrintDump(path, top=20):
+    """Print the top entries of a .prof file (by cumulative time) or a .tracemalloc snapshot (by size)."""
+    if path.endswith('.tracemalloc'):
+        for stat in tracemalloc.Snapshot.load(path).statistics('lineno')[:top]:
+            print(stat)
+    else:
+        pstats.Stats(path).sort_stats('cumulative').print_stats(top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show profiles written by Profiler.dump.")
+    parser.add_argument("paths", nargs='+', help=".prof or .tracemalloc files")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    for path in args.paths:
+        print(f"== {path}")
+        PrintDump(path, args.top)
@@ -1,31 +1,79 @@
+import os
 import random
-import matplotlib.pyplot as plt # type: ignore
-from IPython.display import clear_output
+import shutil
+import tempfile
+import time
+from collections import ChainMap
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np  # type: ignore
 from board import *  # Assuming Board is defined in board.py
+from vector_env import VectorBoard
+from q_table import MappedQTable, MAX_LOAD
+from metrics import BackgroundEvaluator, RingMetricsSink
+from checkpoint import RandomState, SetRandomState
+
+
+def _EpisodeWorker(args):
+    """Play episodes in a worker process against a read-only view of the Q-table and return their histories."""
+    shared, player, board, num_episodes, learning_rate, discount_factor, epsilon, seed = args
+    random.seed(seed)
+    # States first seen in the worker go to a local overlay; the shared table is never written
+    table = ChainMap({}, MappedQTable(shared, mode='r') if isinstance(shared, str) else shared)
+    agent = QAgent(Q_table=table, learning_rate=learning_rate, discount_factor=discount_factor, epsilon=epsilon)
+    return [agent.PlayEpisode(player, board) for _ in range(num_episodes)]
+
+
+def _RowArrays(rows, actions, dtype):
+    """Return {'keys', 'values'} arrays for {state: {action: value}} rows, NaN marking unset actions."""
+    keys = np.fromiter(rows.keys(), dtype=np.uint64, count=len(rows))
+    values = np.full((len(rows), actions), np.nan, dtype=dtype)
+    for i, row in enumerate(rows.values()):
+        for action, value in row.items():
+            values[i, action] = value
+    return {'keys': keys, 'values': values}
+
 
 class QAgent:
-    def __init__(self, Q_table=None, learning_rate=0.1, discount_factor=0.95, epsilon=0.1):
-        if Q_table is not None and not isinstance(Q_table, dict):
-            raise TypeError("Q_table must be a dictionary or None")
-        self.Q_table = Q_table if Q_table else {}
+    def __init__(self, Q_table=None, learning_rate=0.1, discount_factor=0.95, epsilon=0.1, rng=None):
+        if Q_table is not None and not isinstance(Q_table, MutableMapping):
+            raise TypeError("Q_table must be a dictionary, a MappedQTable or None")
+        self.Q_table = Q_table if Q_table is not None else {}
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.epsilon = epsilon
+        self.rng = rng  # random.Random for move choices; None uses the global random module
+        self.dirty = set()  # States whose rows changed since the last checkpoint
 
     def StateToKey(self, board):
-        """Convert board state to a string key for Q-table lookup."""
-        return ''.join(''.join(row) for row in board.board)
-
-    def QLearningMove(self, player, board):
-        state_key = self.StateToKey(board)
-        available_columns = board.AvailableColumns()
+        """Return the board's canonical Zobrist hash as the Q-table key; mirror images share it."""
+        return board.CanonicalKey()[0]
 
+    def SelectColumn(self, state_key, available_columns):
+        """Pick a column for state_key among available_columns (epsilon-greedy)."""
         if state_key not in self.Q_table:
             self.Q_table[state_key] = {col: 0.0 for col in available_columns}
+            self.dirty.add(state_key)
 
         # Select either a random or best action (epsilon-greedy)
-        selected_column = random.choice(available_columns) if random.random() < self.epsilon else \
-                        max(available_columns, key=lambda col: self.Q_table[state_key].get(col, 0.0))
+        rng = self.rng or random
+        if rng.random() < self.epsilon:
+            return rng.choice(available_columns)
+        row = self.Q_table[state_key]  # Fetched once: a MappedQTable lookup probes the file
+        return max(available_columns, key=lambda col: row.get(col, 0.0))
+
+    def QLearningColumn(self, board):
+        """Pick an epsilon-greedy column for board, in board's own frame."""
+        # Q-values are stored in the canonical frame, so mirrored positions map their columns across
+        state_key, mirrored = board.CanonicalKey()
+        available_columns = board.AvailableColumns()
+        if mirrored:
+            available_columns = [board.MirrorColumn(col) for col in available_columns]
+        selected_column = self.SelectColumn(state_key, available_columns)
+        return board.MirrorColumn(selected_column) if mirrored else selected_column
+
+    def QLearningMove(self, player, board):
+        selected_column = self.QLearningColumn(board)
 
         # Get the row where the piece should be placed in the selected column
         row = board.AvailableRowInColumn(selected_column)  # Pass only the column index
@@ -33,112 +81,305 @@ class QAgent:
         if row != -1:  # If a valid row is found
             # Apply the move to the board
             next_board = board.copy()  # Create a copy of the board
-            next_board.board[row][selected_column] = player  # Apply the move to the board
+            next_board.play(selected_column, player)  # Apply the move to the board
         else:
             next_board = board  # If no valid row, return the original board
         
         return next_board, selected_column
 
-    def TrainQLearning(self, player, num_episode, board, num_simulations=1, output_type="verbose"):
+    def PlayEpisode(self, player, board, output_type="none"):
+        """Play one training episode from a reset board against a random opponent.
+
+        Returns the episode history as (state, action, next_state, reward) tuples
+        with canonical state keys and actions.
+        """
+        opponent = 'Y' if player == 'R' else 'R'
+        board.reset()  # Reset board at the beginning of each simulation
+        done, turn = False, player
+        history, reward = [], 0  # Initialize history and reward
+
+        while not done:
+            state_key, mirrored = board.CanonicalKey()
+            available_columns = board.AvailableColumns()
+            if not available_columns:
+                break
+
+            # Select move based on epsilon-greedy strategy
+            action = self.QLearningColumn(board) if turn == player else (self.rng or random).choice(available_columns)
+
+            next_state_key = self.StateToKey(board)
+            canonical_action = board.MirrorColumn(action) if mirrored else action
+            history.append((state_key, canonical_action, next_state_key, reward))  # Track state-action transitions
+
+            if turn == player:
+                board.play(action, turn)  # Update board state in place
+
+            # Display board after each move (verbose mode)
+            if output_type == "verbose":
+                print(f"After {turn}'s move (column {action + 1}):")
+                board.PrintBoard()
+
+            # Check for win/loss/draw
+            if board.CheckWin(player):
+                reward, done = 1, True
+            elif board.CheckWin(opponent):
+                reward, done = -1, True
+            elif not available_columns:  # Draw condition
+                reward, done = 0, True
+
+            # Switch turns
+            turn = opponent if turn == player else player
+
+        return history
+
+    def ApplyHistory(self, history):
+        """Backpropagate reward through an episode history produced by PlayEpisode."""
+        for state, action, next_state, reward in reversed(history):
+            # Rows are replaced rather than changed in place, so a shallow copy of a dict table is a snapshot
+            row = dict(self.Q_table.get(state, {}))
+            row.setdefault(action, 0.0)
+            next_row = row if next_state == state else self.Q_table.setdefault(next_state, {})
+            self.dirty.update((state, next_state))
+
+            # Update Q-values
+            max_future = max(next_row.values(), default=0)
+            row[action] += self.learning_rate * (reward + self.discount_factor * max_future - row[action])
+            self.Q_table[state] = row
+            reward *= self.discount_factor  # Discount reward
+
+    def TrainQLearning(self, player, num_episode, board, num_simulations=1, output_type="verbose",
+                       metrics=None, eval_every=50, checkpoint=None, checkpoint_every=100, profiler=None):
+        """Train for num_simulations episodes and return [(episode, win rate, 0.5)] evaluations.
+
+        Per-episode metrics (reward, epsilon, length, states/sec) go to metrics,
+        a MetricsSink that defaults to an in-memory ring. Every eval_every
+        episodes the win rate is measured on a background thread against a
+        snapshot of the table. Nothing is plotted while training; use
+        metrics.PlotMetrics or PlotLearningCurve afterwards.
+
+        With a checkpoint.Checkpointer, training first resumes from its last
+        checkpoint, then saves one every checkpoint_every episodes and at the
+        end. The returned evaluations only cover this run.
+
+        With an enabled profiling.Profiler, each episode's hot-path call
+        counts and times are added to its metrics record.
+        """
         print("Training QLearning...")
         opponent = 'Y' if player == 'R' else 'R'
-        win_rates = []
-
-        for num_episode in range(num_simulations):
-            board.reset()  # Reset board at the beginning of each simulation
-            done, turn = False, player
-            history, reward = [], 0  # Initialize history and reward
-
-            while not done:
-                state_key = self.StateToKey(board)
-                available_columns = board.AvailableColumns()
-                if not available_columns:
-                    break
-
-                # Select move based on epsilon-greedy strategy
-                next_board, action = self.QLearningMove(turn, board) if turn == player else (
-                    board.copy(), random.choice(available_columns))
-
-                next_state_key = self.StateToKey(board)
-                history.append((state_key, action, next_state_key, reward))  # Track state-action transitions
-
-                board.board = next_board.board  # Update board state
-
-                # Display board after each move (verbose mode)
-                if output_type == "verbose":
-                    print(f"After {turn}'s move (column {action + 1}):")
-                    board.PrintBoard()
-
-                # Check for win/loss/draw
-                if board.CheckWin(player):
-                    reward, done = 1, True
-                elif board.CheckWin(opponent):
-                    reward, done = -1, True
-                elif not available_columns:  # Draw condition
-                    reward, done = 0, True
-
-                # Switch turns
-                turn = opponent if turn == player else player
-
-            # Backpropagate reward through history
-            for state, action, next_state, reward in reversed(history):
-                self.Q_table.setdefault(state, {})
-                self.Q_table[state].setdefault(action, 0.0)
-                self.Q_table.setdefault(next_state, {})
-
-                # Update Q-values
-                max_future = max(self.Q_table[next_state].values(), default=0)
-                self.Q_table[state][action] += self.learning_rate * (reward + self.discount_factor * max_future - self.Q_table[state][action])
-                reward *= self.discount_factor  # Discount reward
-
-            # Print and plot win rates every 50 episodes
-            if num_episode % 50 == 0:
-                q_learning_win_rate = self.EvaluateAgent(player)
-                win_rates.append((num_episode, q_learning_win_rate, 0.5))  # Adjust to your desired random win rate
-                self.PlotLearningCurve(win_rates, live_update=True)
-                print(f"Episode {num_episode}, Q-learning Win rate: {q_learning_win_rate:.2f}")
+        sink = metrics if metrics is not None else RingMetricsSink()
+        evaluator = BackgroundEvaluator(sink)
+        start = time.perf_counter()
+        states = 0
+        first = self.Restore(checkpoint) if checkpoint is not None else 0
+        if first:
+            print(f"Resuming from episode {first}.")
+
+        for num_episode in range(first, num_simulations):
+            history = self.PlayEpisode(player, board, output_type)
+            self.ApplyHistory(history)
+
+            states += len(history)
+            reward = 1 if board.CheckWin(player) else -1 if board.CheckWin(opponent) else 0
+            elapsed = time.perf_counter() - start
+            sink.record(episode=num_episode, reward=reward, epsilon=self.epsilon, length=len(history),
+                        states_per_sec=states / elapsed if elapsed > 0 else 0.0,
+                        **(profiler.summary('episode') if profiler is not None and profiler.enabled else {}))
+
+            # Evaluate win rates every eval_every episodes without blocking training
+            if num_episode % eval_every == 0:
+                evaluator.submit(lambda agent=self.SnapshotAgent(): agent.EvaluateAgent(player), num_episode)
 
+            if checkpoint is not None and (num_episode + 1) % checkpoint_every == 0:
+                self.Checkpoint(checkpoint, num_episode + 1)
+
+        if checkpoint is not None:
+            if num_simulations > first and num_simulations % checkpoint_every:
+                self.Checkpoint(checkpoint, num_simulations)
+            checkpoint.flush()
+        win_rates = [(episode, win_rate, 0.5) for episode, win_rate in evaluator.close()]
         print("Training completed.")
-        self.PlotFinalResults(win_rates)
+        if win_rates:
+            print(f"Final Q-learning Win rate: {win_rates[-1][1]:.2f}")
         return win_rates
 
+    def Checkpoint(self, checkpointer, episode):
+        """Queue a checkpoint of the training state with episode as the next episode to play.
+
+        Full checkpoints hold every Q-table row; deltas only the rows changed
+        since the previous checkpoint. Rows are (keys, values) arrays with
+        NaN for unset actions, as in MappedQTable.
+        """
+        full = checkpointer.needs_full()
+        mapped = isinstance(self.Q_table, MappedQTable)
+        if mapped and full:
+            keys, values = self.Q_table.ToArrays()
+            arrays = {'keys': keys, 'values': values}
+        else:
+            # Only the row references are copied here; the writer thread builds the arrays from them
+            rows = dict(self.Q_table) if full else {key: self.Q_table[key] for key in self.dirty}
+            if mapped:
+                rows = {key: dict(row) for key, row in rows.items()}  # QRow is a live view of the file
+            actions = getattr(self.Q_table, 'actions', COLUMNS)
+            dtype = np.float32 if mapped else np.float64  # Keep dict values exact
+            arrays = lambda: _RowArrays(rows, actions, dtype)
+        state = {'episode': episode, 'epsilon': self.epsilon, 'learning_rate': self.learning_rate,
+                 'discount_factor': self.discount_factor, 'random_state': RandomState(),
+                 'agent_random_state': None if self.rng is None else self.rng.getstate()}
+        checkpointer.save(arrays, state, full)
+        self.dirty.clear()
+
+    def Restore(self, checkpointer):
+        """Load the last checkpoint into this agent and return the episode to resume from (0 if none).
+
+        A MappedQTable is rebuilt in place from the checkpoint, dropping rows
+        that were written after it.
+        """
+        chain = checkpointer.load()
+        if not chain:
+            return 0
+        rows = {}
+        for arrays, _ in chain:  # Later deltas overwrite earlier rows
+            rows.update(zip(arrays['keys'].tolist(), arrays['values']))
+        keys = np.fromiter(rows.keys(), dtype=np.uint64, count=len(rows))
+        values = np.array(list(rows.values())).reshape(len(rows), -1)
+
+        if isinstance(self.Q_table, MappedQTable):
+            path = self.Q_table.path
+            self.Q_table = None
+            os.remove(path)
+            self.Q_table = MappedQTable(path, capacity=max(1, int(len(rows) / MAX_LOAD) + 1))
+            self.Q_table.UpdateRows(keys, values)
+            self.Q_table.flush()
+        else:
+            self.Q_table = {int(key): {int(a): float(row[a]) for a in np.flatnonzero(~np.isnan(row))}
+                            for key, row in zip(keys, values)}
+
+        state = chain[-1][1]
+        self.epsilon = state['epsilon']
+        self.learning_rate = state['learning_rate']
+        self.discount_factor = state['discount_factor']
+        SetRandomState(state['random_state'])
+        if state['agent_random_state'] is not None:
+            version, internal, gauss = state['agent_random_state']
+            self.rng = random.Random()
+            self.rng.setstate((version, tuple(internal), gauss))
+        self.dirty.clear()
+        return state['episode']
+
+    def SnapshotAgent(self):
+        """Return an agent over a snapshot of the Q-table that is safe to use from another thread.
+
+        A dict table is copied shallowly. The row dicts are shared, but
+        training never changes a row in place (ApplyHistory replaces it), so
+        the snapshot keeps the values it had when it was taken. A MappedQTable
+        is read through a copy of its file (MappedQTable.Snapshot), since the
+        file itself keeps changing under training.
+        """
+        if isinstance(self.Q_table, MappedQTable):
+            table = ChainMap({}, self.Q_table.Snapshot())
+        else:
+            table = dict(self.Q_table)
+        # A private generator seeded from ours keeps evaluation from disturbing the training random stream
+        return QAgent(Q_table=table, learning_rate=self.learning_rate, discount_factor=self.discount_factor,
+                      epsilon=self.epsilon, rng=random.Random((self.rng or random).getrandbits(63)))
+
+    def TrainQLearningParallel(self, player, num_episodes, board, workers=None, episodes_per_task=100):
+        """Train on num_episodes self-play episodes generated by a pool of worker processes.
+
+        Episodes are played in rounds of episodes_per_task per worker. Each
+        round reads a snapshot of the Q-table (MappedQTable.Snapshot) taken
+        when it is submitted, so no worker sees the table change under it.
+        Generation and learning overlap: round k + 1 is submitted before the
+        learner applies the histories of round k, task by task in submission
+        order as each finishes. Workers therefore play against a table one
+        round behind the learner, and a seeded run is reproducible. A dict
+        table is shared through a temporary MappedQTable that is given only
+        the rows changed in each round.
+
+        Starting the pool, sending histories between processes and copying
+        the table each round cost time that serial training does not pay, so
+        this only pays off with several cores: with one worker it is slower
+        than TrainQLearning.
+        """
+        print("Training QLearning in parallel...")
+        workers = workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        directory = mirror = None
+        if not isinstance(self.Q_table, MappedQTable):
+            directory = tempfile.mkdtemp(prefix='qtable_')
+            mirror = MappedQTable.FromDict(os.path.join(directory, 'shared.bin'), self.Q_table)
+        round_sizes = [min(workers * episodes_per_task, num_episodes - done)
+                       for done in range(0, num_episodes, workers * episodes_per_task)]
+        changed = set()
+        playing = None  # (futures, snapshot) of the round the learner applies next
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for round_size in round_sizes + [0]:
+                    # Queue the next round first, so workers play it while this one is applied
+                    submitted = self._SubmitRound(executor, player, board, round_size, workers, mirror, changed) \
+                        if round_size else None
+                    changed = set()
+                    if playing is not None:
+                        for future in playing[0]:
+                            for history in future.result():
+                                self.ApplyHistory(history)
+                                changed.update(key for state, _, next_state, _ in history
+                                               for key in (state, next_state))
+                    playing = submitted
+        finally:
+            if directory is not None:
+                mirror = None
+                shutil.rmtree(directory, ignore_errors=True)
+
+        done = sum(round_sizes)
+        elapsed = time.perf_counter() - start
+        print(f"Training completed: {done} episodes in {elapsed:.1f}s ({done / elapsed:.0f} episodes/s).")
+        return {'episodes': done, 'elapsed': elapsed, 'episodes_per_second': done / elapsed}
+
+    def _SubmitRound(self, executor, player, board, round_size, workers, mirror, changed):
+        """Submit round_size episodes split over workers tasks and return (futures, snapshot they read)."""
+        snapshot = self._SharedTable(mirror, changed)
+        sizes = [round_size // workers + (1 if i < round_size % workers else 0) for i in range(workers)]
+        futures = [executor.submit(_EpisodeWorker, (snapshot.path, player, board, size, self.learning_rate,
+                                                    self.discount_factor, self.epsilon, random.getrandbits(63)))
+                   for size in sizes if size]
+        return futures, snapshot
+
+    def _SharedTable(self, mirror=None, changed=()):
+        """Return a read-only snapshot of the current Q-table that workers can open by its path.
+
+        A dict table is copied from mirror, a MappedQTable that first
+        receives the rows in changed.
+        """
+        if isinstance(self.Q_table, MappedQTable):
+            return self.Q_table.Snapshot()
+        if changed:
+            arrays = _RowArrays({key: self.Q_table[key] for key in changed}, mirror.actions, np.float32)
+            mirror.UpdateRows(arrays['keys'], arrays['values'])
+        return mirror.Snapshot()
+
     def EvaluateAgent(self, player, num_games=20):
-        wins = 0
-        opponent = 'Y' if player == 'R' else 'R'
+        """Play num_games against a uniform random opponent in lockstep and return the win rate."""
+        player_code = SYMBOLS[player.lower()]
+        env = VectorBoard(num_games, first_player=player_code, auto_reset=False)  # All games start from an empty board
+        rng = np.random.RandomState((self.rng or random).getrandbits(32))
+
+        while not env.done.all():
+            legal = env.legal_moves()
+            actions = env.random_actions(rng)  # Opponent moves; the agent's boards are overwritten below
+            keys, mirrored = env.canonical_keys()
+            for game in np.flatnonzero(~env.done & (env.turn == player_code)):
+                columns = legal[game, ::-1] if mirrored[game] else legal[game]
+                action = self.SelectColumn(int(keys[game]), np.flatnonzero(columns).tolist())
+                actions[game] = env.cols - 1 - action if mirrored[game] else action
+            env.step(actions)
 
-        for _ in range(num_games):
-            board = Board()  # Initialize a new game board
-            turn = player
-            done = False
-
-            while not done:
-                available_columns = board.AvailableColumns()
-                if not available_columns:
-                    break  # No available moves, the game ends
-
-                if turn == player:
-                    _, action = self.QLearningMove(player, board)
-                    row = board.AvailableRowInColumn(action)
-                    if row != -1:
-                        board.board[row][action] = player
-                else:
-                    action = random.choice(available_columns)
-                    row = board.AvailableRowInColumn(action)
-                    if row != -1:
-                        board.board[row][action] = opponent
-
-                if board.CheckWin(player):  # Check if the current player wins
-                    wins += 1
-                    break
-                elif board.CheckWin(opponent) or not board.AvailableColumns():  # Check if opponent wins or no moves left
-                    break
-
-                turn = opponent if turn == player else player  # Switch turns
-
-        return wins / num_games  # Return win rate
+        return np.count_nonzero(env.winner == player_code) / num_games  # Return win rate
 
     def PlotLearningCurve(self, win_rates, live_update=False):
         """Plot the learning curve of the agent's performance."""
+        import matplotlib.pyplot as plt  # type: ignore
         episodes = [entry[0] for entry in win_rates]
         q_learning_win_rates = [entry[1] for entry in win_rates]
         random_win_rates = [entry[2] for entry in win_rates]
@@ -153,6 +394,7 @@ class QAgent:
         plt.grid(True)
 
         if live_update:
+            from IPython.display import clear_output
             clear_output(wait=True)  # Ensure real-time updates in Jupyter environments
             plt.show()
         else:
@@ -0,0 +1,293 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+import numpy as np  # type: ignore
+from board import COLUMNS
+
+MAGIC = b'C4QT'
+VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('actions', '<u4'), ('pad', '<u4'),
+                         ('capacity', '<u8'), ('count', '<u8')])
+MAX_LOAD = 0.7  # Grow the table once this fraction of slots is used
+
+
+def _RemoveFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _RecordDtype(actions):
+    # Unset actions hold NaN so a row behaves like the per-state dicts QAgent used to keep
+    return np.dtype([('key', '<u8'), ('used', 'u1'), ('values', '<f4', (actions,))])
+
+
+class QRow(MutableMapping):
+    """Dict-like {action: value} view of one state's row in a MappedQTable."""
+
+    def __init__(self, table, slot):
+        self._values = table.value_array[slot]
+
+    def __getitem__(self, action):
+        value = self._values[action]
+        if np.isnan(value):
+            raise KeyError(action)
+        return float(value)
+
+    def __setitem__(self, action, value):
+        self._values[action] = value
+
+    def __delitem__(self, action):
+        if np.isnan(self._values[action]):
+            raise KeyError(action)
+        self._values[action] = np.nan
+
+    def __iter__(self):
+        return iter(np.flatnonzero(~np.isnan(self._values)).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self._values)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class MappedQTable(MutableMapping):
+    """Q-table persisted in a memory-mapped file.
+
+    Each integer state key (Board.StateToKey) maps to a fixed float32 row of
+    action values. The rows sit in an open-addressing hash index with linear
+    probing. Lookups return QRow views, so QAgent can use the table like its
+    dict of dicts. Open with mode='r' to share a table read-only between
+    processes. Row views become stale when the table grows, so do not keep
+    them across inserts.
+    """
+
+    def __init__(self, path, mode='r+', capacity=1 << 16, actions=COLUMNS):
+        self.path = path
+        self.mode = mode
+        if not os.path.exists(path):
+            if mode == 'r':
+                raise FileNotFoundError(f"Q-table file {path} not found.")
+            self._Create(path, capacity, actions)
+        self._Open()
+
+    @staticmethod
+    def _Create(path, capacity, actions):
+        capacity = 1 << max(int(capacity) - 1, 1).bit_length()  # Round up to a power of two
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (MAGIC, VERSION, actions, 0, capacity, 0)
+        records = np.zeros(capacity, dtype=_RecordDtype(actions))
+        records['values'] = np.nan
+        with open(path, 'wb') as file:
+            file.write(header.tobytes())
+            file.write(records.tobytes())
+
+    def _Open(self):
+        self.header = np.memmap(self.path, dtype=HEADER_DTYPE, mode=self.mode, shape=(1,))
+        if self.header['magic'][0] != MAGIC:
+            raise ValueError(f"{self.path} is not a Q-table file.")
+        self.actions = int(self.header['actions'][0])
+        self.capacity = int(self.header['capacity'][0])
+        self.records = np.memmap(self.path, dtype=_RecordDtype(self.actions), mode=self.mode,
+                                 offset=HEADER_DTYPE.itemsize, shape=(self.capacity,))
+        # Plain ndarray views of the fields: indexing a memmap field re-wraps every result, which dominates lookups
+        self.key_array = np.asarray(self.records['key'])
+        self.used_array = np.asarray(self.records['used'])
+        self.value_array = np.asarray(self.records['values'])
+
+    def _Slot(self, key):
+        """Return the slot holding key, or the empty slot where it would go."""
+        keys, used = self.key_array, self.used_array
+        mask = self.capacity - 1
+        slot = key & mask
+        while used[slot] and keys[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+
+    def Lookup(self, keys):
+        """Return the slot of every key in keys (an array), or -1 where the key is absent."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        mask = np.uint64(self.capacity - 1)
+        slots = (keys & mask).astype(np.int64)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            probe = slots[pending]
+            used = self.records['used'][probe].astype(bool)
+            found = used & (self.records['key'][probe] == keys[pending])
+            result[pending[found]] = probe[found]
+            pending = pending[used & ~found]  # Empty slot ends the probe: the key is absent
+            slots[pending] = (slots[pending] + 1) & (self.capacity - 1)
+        return result
+
+    def __getitem__(self, key):
+        slot = self._Slot(key)
+        if not self.used_array[slot]:
+            raise KeyError(key)
+        return QRow(self, slot)
+
+    def __setitem__(self, key, row):
+        slot = self._Slot(key)
+        if not self.used_array[slot]:
+            if (self.count + 1) > MAX_LOAD * self.capacity:
+                self._Grow()
+                slot = self._Slot(key)
+            self.key_array[slot] = key
+            self.used_array[slot] = 1
+            self.header['count'] += 1
+        values = np.full(self.actions, np.nan, dtype=np.float32)
+        for action, value in dict(row).items():
+            values[action] = value
+        self.value_array[slot] = values
+
+    def __delitem__(self, key):
+        """Remove key, shifting later entries of its probe run back so lookups need no tombstones."""
+        if self.mode == 'r':
+            raise PermissionError("Cannot delete from a Q-table opened read-only.")
+        records = self.records
+        mask = self.capacity - 1
+        hole = self._Slot(key)
+        if not records['used'][hole]:
+            raise KeyError(key)
+        slot = hole
+        while True:
+            slot = (slot + 1) & mask
+            if not records['used'][slot]:
+                break
+            home = int(records['key'][slot]) & mask
+            # An entry can fill the hole only if the hole lies on its probe path from home
+            if (slot - home) & mask >= (slot - hole) & mask:
+                records[hole] = records[slot]
+                hole = slot
+        records['used'][hole] = 0
+        records['key'][hole] = 0
+        records['values'][hole] = np.nan
+        self.header['count'] -= 1
+
+    def __contains__(self, key):
+        return bool(self.used_array[self._Slot(key)])
+
+    def __iter__(self):
+        used = np.flatnonzero(self.records['used'])
+        return iter(self.records['key'][used].tolist())
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def count(self):
+        return int(self.header['count'][0])
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default if default is not None else {}
+        return self[key]
+
+    def _Insert(self, records, keys, values):
+        """Vectorized linear-probing insert of new keys into a records array."""
+        capacity = len(records)
+        slots = (keys & np.uint64(capacity - 1)).astype(np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            probe = slots[pending]
+            free = ~records['used'][probe].astype(bool)
+            # Among keys probing the same free slot, the first one takes it
+            candidates = pending[free]
+            _, first = np.unique(slots[candidates], return_index=True)
+            winners = candidates[first]
+            records['key'][slots[winners]] = keys[winners]
+            records['used'][slots[winners]] = 1
+            records['values'][slots[winners]] = values[winners]
+            placed = np.zeros(len(keys), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            blocked = pending[records['used'][slots[pending]].astype(bool)]
+            slots[blocked] = (slots[blocked] + 1) & (capacity - 1)
+
+    def _Grow(self, min_capacity=None):
+        """Rehash into a file with twice the slots (or enough for min_capacity entries)."""
+        if self.mode == 'r':
+            raise PermissionError("Cannot grow a Q-table opened read-only.")
+        capacity = self.capacity * 2
+        while min_capacity is not None and min_capacity > MAX_LOAD * capacity:
+            capacity *= 2
+        used = np.flatnonzero(self.records['used'])
+        keys = np.array(self.records['key'][used])
+        values = np.array(self.records['values'][used])
+        self.flush()
+        temp_path = self.path + '.tmp'
+        self._Create(temp_path, capacity, self.actions)
+        records = np.memmap(temp_path, dtype=_RecordDtype(self.actions), mode='r+',
+                            offset=HEADER_DTYPE.itemsize, shape=(capacity,))
+        self._Insert(records, keys, values)
+        records.flush()
+        header = np.memmap(temp_path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        header['count'] = len(keys)
+        header.flush()
+        del records, header
+        self.header = self.records = self.key_array = self.used_array = self.value_array = None
+        os.replace(temp_path, self.path)
+        self._Open()
+
+    def UpdateRows(self, keys, values):
+        """Bulk insert or overwrite rows: keys is (N,) and values is (N, actions) with NaN for unset."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.float32)
+        keys, index = np.unique(keys, return_index=True)
+        values = values[index]
+        slots = self.Lookup(keys)
+        present = slots >= 0
+        self.records['values'][slots[present]] = values[present]
+        new = ~present
+        if new.any():
+            if self.count + new.sum() > MAX_LOAD * self.capacity:
+                self._Grow(self.count + new.sum())
+            self._Insert(self.records, keys[new], values[new])
+            self.header['count'] += int(new.sum())
+
+    def ToArrays(self):
+        """Return (keys, values) arrays for every stored state."""
+        used = np.flatnonzero(self.records['used'])
+        return np.array(self.records['key'][used]), np.array(self.records['values'][used])
+
+    @classmethod
+    def FromDict(cls, path, table, actions=COLUMNS):
+        """Write a dict-of-dicts Q-table to path and return it opened for writing."""
+        mapped = cls(path, capacity=max(1, int(len(table) / MAX_LOAD) + 1), actions=actions)
+        keys = np.fromiter(table.keys(), dtype=np.uint64, count=len(table))
+        values = np.full((len(table), actions), np.nan, dtype=np.float32)
+        for i, row in enumerate(table.values()):
+            for action, value in row.items():
+                values[i, action] = value
+        mapped.UpdateRows(keys, values)
+        mapped.flush()
+        return mapped
+
+    def Snapshot(self):
+        """Return a read-only copy of the table in a temporary file, removed once the copy is released.
+
+        The file is copied by the OS next to the original, so taking a
+        snapshot costs no Python work per state.
+        """
+        self.flush()
+        fd, path = tempfile.mkstemp(prefix='qtable_snapshot_', suffix='.bin', dir=os.path.dirname(self.path) or None)
+        os.close(fd)
+        shutil.copyfile(self.path, path)
+        snapshot = MappedQTable(path, mode='r')
+        weakref.finalize(snapshot, _RemoveFile, path)
+        return snapshot
+
+    def ToDict(self):
+        """Return the table as an in-memory dict of {action: value} dicts."""
+        keys, values = self.ToArrays()
+        return {int(key): {int(a): float(row[a]) for a in np.flatnonzero(~np.isnan(row))}
+                for key, row in zip(keys, values)}
+
+    def flush(self):
+        if self.mode != 'r':
+            self.records.flush()
+            self.header.flush()
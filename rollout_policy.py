@@ -0,0 +1,159 @@
+import random
+import numpy as np  # type: ignore
+from opening_book import BookKey, OpeningBook
+
+
+def PredictBatch(rl_policy, boards):
+    """Evaluate boards with one rl_policy.predict_batch call, or per board if the policy has none."""
+    if hasattr(rl_policy, 'predict_batch'):
+        return rl_policy.predict_batch(boards)
+    return np.array([rl_policy.predict(board) for board in boards])
+
+
+class RolloutPolicy:
+    """Picks the move for one ply of a UCT rollout; only legal columns are ever returned.
+
+    Costly policies consult their source only on the first max_plies plies
+    of each rollout (None means every ply) and hand later plies, and
+    positions their source cannot answer, to the cheaper fallback.
+    """
+
+    def __init__(self, fallback=None, max_plies=None):
+        self.fallback = fallback
+        self.max_plies = max_plies
+
+    def within_budget(self, ply):
+        return self.max_plies is None or ply < self.max_plies
+
+    def select(self, board, turn, ply=0):
+        """Return the column to play for turn on board at the given ply of the rollout."""
+        raise NotImplementedError
+
+    def select_batch(self, boards, turns, ply=0, q_values=None):
+        """Return one column per board; q_values are policy values already computed for these boards."""
+        return [self.select(board, turn, ply) for board, turn in zip(boards, turns)]
+
+    def _Fallback(self, board, turn, ply):
+        if self.fallback is None:
+            return random.choice(board.AvailableColumns())
+        return self.fallback.select(board, turn, ply)
+
+
+class RandomRollout(RolloutPolicy):
+    """Uniformly random legal moves."""
+
+    def select(self, board, turn, ply=0):
+        return random.choice(board.AvailableColumns())
+
+
+class CenterWeightedRollout(RolloutPolicy):
+    """Random legal moves weighted towards the center, where more fours pass through."""
+
+    def __init__(self, weights=None):
+        super().__init__()
+        self.weights = weights
+
+    def select(self, board, turn, ply=0):
+        weights = self.weights or [board.cols - abs(2 * col - (board.cols - 1)) for col in range(board.cols)]
+        moves = board.AvailableColumns()
+        return random.choices(moves, [weights[col] for col in moves])[0]
+
+
+class WinBlockRollout(RolloutPolicy):
+    """Completes a four when possible, otherwise blocks the opponent's, otherwise asks the fallback."""
+
+    def __init__(self, fallback=None, max_plies=None):
+        super().__init__(fallback if fallback is not None else CenterWeightedRollout(), max_plies)
+
+    def select(self, board, turn, ply=0):
+        if not self.within_budget(ply):
+            return self._Fallback(board, turn, ply)
+        wins = board.WinningColumns(turn)
+        if wins:
+            return wins[0]
+        blocks = board.WinningColumns('Y' if turn == 'R' else 'R')
+        if blocks:
+            return blocks[0]
+        return self._Fallback(board, turn, ply)
+
+
+class TableRollout(RolloutPolicy):
+    """Plays moves from a distilled policy table, such as an opening book file.
+
+    table is an OpeningBook, a path to one, or a dict mapping
+    opening_book.BookKey keys to columns in the canonical frame. Positions
+    missing from the table go to the fallback.
+    """
+
+    def __init__(self, table, fallback=None, max_plies=None):
+        super().__init__(fallback if fallback is not None else WinBlockRollout(), max_plies)
+        self.table = table
+        self.book = table if isinstance(table, OpeningBook) else None
+
+    def __getstate__(self):
+        # Reopen the book file in worker processes rather than pickling the memory map
+        state = self.__dict__.copy()
+        if isinstance(self.table, OpeningBook):
+            state['table'] = self.table.path
+        state['book'] = None
+        return state
+
+    def select(self, board, turn, ply=0):
+        if self.within_budget(ply):
+            if isinstance(self.table, dict):
+                key, mirrored = BookKey(board, turn)
+                move = self.table.get(key)
+                if move is not None:
+                    move = board.MirrorColumn(move) if mirrored else move
+            else:
+                if self.book is None:
+                    self.book = OpeningBook(self.table)
+                entry = self.book.Lookup(board, turn)
+                move = None if entry is None else entry[0]
+            if move is not None and board.heights[move] < board.rows:
+                return move
+        return self._Fallback(board, turn, ply)
+
+
+class RLRollout(RolloutPolicy):
+    """Plays the legal column with the highest rl_policy value (the original UCT rollout)."""
+
+    def __init__(self, rl_policy, fallback=None, max_plies=None):
+        super().__init__(fallback, max_plies)
+        self.rl_policy = rl_policy
+
+    def select(self, board, turn, ply=0):
+        if not self.within_budget(ply):
+            return self._Fallback(board, turn, ply)
+        return self._Best(board, self.rl_policy.predict(board))
+
+    def select_batch(self, boards, turns, ply=0, q_values=None):
+        if not self.within_budget(ply):
+            return [self._Fallback(board, turn, ply) for board, turn in zip(boards, turns)]
+        if q_values is None:
+            q_values = PredictBatch(self.rl_policy, boards)
+        return [self._Best(board, values) for board, values in zip(boards, q_values)]
+
+    @staticmethod
+    def _Best(board, values):
+        return max(board.AvailableColumns(), key=lambda col: values[col])
+
+
+ROLLOUT_POLICIES = ("rl", "random", "center", "winblock", "table:<book path>")
+
+
+def MakeRolloutPolicy(policy, rl_policy):
+    """Return a RolloutPolicy from one itself, a name in ROLLOUT_POLICIES, or None (the rl policy)."""
+    if policy is None or policy == "rl":
+        return RLRollout(rl_policy)
+    if isinstance(policy, RolloutPolicy):
+        return policy
+    if policy == "random":
+        return RandomRollout()
+    if policy == "center":
+        return CenterWeightedRollout()
+    if policy == "winblock":
+        return WinBlockRollout()
+    if isinstance(policy, str) and policy.startswith("table:"):
+        return TableRollout(policy[len("table:"):])
+    raise ValueError(f"Invalid rollout policy: {policy}. Valid policies: {', '.join(ROLLOUT_POLICIES)}.")
@@ -0,0 +1,192 @@
+import time
+from board import *
+
+EXACT, LOWER, UPPER = 0, 1, 2  # Transposition table bound types
+TIME_CHECK_INTERVAL = 4096  # Nodes between deadline checks
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Solver:
+    """Negamax alpha-beta search over the bitboards of a Board.
+
+    Scores are from the side to move: 0 is a draw, a positive score wins and
+    a negative one loses, and the magnitude is (empty cells + 1 - plies to
+    the end of the game) // 2 counted from the root, so faster wins score
+    higher. Moves are tried transposition-table move first, then by how many
+    winning cells they create, then center first. Results of every search
+    are cached in a fixed-size, always-replace transposition table that is
+    kept between calls.
+    """
+
+    def __init__(self, rows=ROWS, cols=COLUMNS, table_size=1 << 20):
+        self.rows = rows
+        self.cols = cols
+        self.height = rows + 1
+        self.cells = rows * cols
+        self.bottom_mask = sum(1 << (col * self.height) for col in range(cols))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_masks = [((1 << rows) - 1) << (col * self.height) for col in range(cols)]
+        self.order = sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1)))  # Center first
+        self.table_size = table_size
+        self.clear()
+        self.stats = {}
+
+    def clear(self):
+        """Empty the transposition table."""
+        self.keys = [0] * self.table_size
+        self.entries = [None] * self.table_size  # (depth, value, bound, best column)
+
+    def _WinningCells(self, position, mask):
+        """Return the empty cells where position would complete four in a row."""
+        return WinningCells(position, self.height) & (self.board_mask ^ mask)
+
+    def _Possible(self, mask):
+        """Return the playable cell of every column that is not full."""
+        return (mask + self.bottom_mask) & self.board_mask
+
+    def _Position(self, board, player):
+        if player is None:
+            player = 'R' if sum(board.heights) % 2 == 0 else 'Y'
+        if (board.rows, board.cols) != (self.rows, self.cols):
+            raise ValueError(f"Solver is for {self.rows}x{self.cols} boards, got {board.rows}x{board.cols}.")
+        current = board.bitboards[PLAYER_INDEX[player]]
+        mask = board.bitboards[0] | board.bitboards[1]
+        return current, mask, sum(board.heights)
+
+    def search(self, board, player=None, depth=None, time_budget_ms=None):
+        """Return the best column for player (default: the side to move) on board.
+
+        Iterative deepening runs until the position is solved, depth plies
+        have been searched, or time_budget_ms runs out; the move of the last
+        completed iteration is returned. Score, depth and node counts are
+        left in self.stats. Returns None when the board is full or already won.
+        """
+        current, mask, moves = self._Position(board, player)
+        if not self._Possible(mask) or board.CheckWin('R') or board.CheckWin('Y'):
+            return None
+        start = time.perf_counter()
+        self.deadline = None if time_budget_ms is None else start + time_budget_ms / 1000
+        self.nodes = 0
+        max_depth = self.cells - moves if depth is None else min(depth, self.cells - moves)
+
+        best = None
+        score = 0
+        completed = 0
+        winning = self._Possible(mask) & self._WinningCells(current, mask)
+        if winning:  # An immediate win needs no search
+            best = self._Column(winning & -winning)
+            score = (self.cells + 1 - moves) // 2
+            completed = 1
+        else:
+            for iteration in range(1, max(max_depth, 1) + 1):
+                try:
+                    score, best = self._Root(current, mask, moves, iteration)
+                except _Timeout:
+                    break
+                completed = iteration
+                if score != 0 or iteration >= self.cells - moves:
+                    break  # A forced result or a full-depth search is exact
+            if best is None:  # Out of time before the first iteration finished
+                best = next(col for col in self.order if self._Possible(mask) & self.column_masks[col])
+
+        elapsed = time.perf_counter() - start
+        self.stats = {'score': score, 'depth': completed, 'nodes': self.nodes, 'elapsed': elapsed,
+                      'nodes_per_second': self.nodes / elapsed if elapsed > 0 else 0.0,
+                      'solved': score != 0 or completed >= self.cells - moves}
+        return best
+
+    def evaluate(self, board, player=None, depth=None, time_budget_ms=None):
+        """Return the score of board for player; exact when the search reaches the end of the game."""
+        self.search(board, player, depth, time_budget_ms)
+        return self.stats.get('score', 0)
+
+    def _Column(self, move):
+        return (move.bit_length() - 1) // self.height
+
+    def _Root(self, current, mask, moves, depth):
+        alpha, beta = -self.cells, self.cells
+        best_score, best = None, None
+        for move in self._OrderedMoves(current, mask, self._NonLosingMoves(current, mask), None):
+            score = -self._Negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha, depth - 1)
+            if best_score is None or score > best_score:
+                best_score, best = score, self._Column(move)
+            alpha = max(alpha, score)
+        if best is None:  # Every move loses at once: play anywhere legal
+            move = self._Possible(mask)
+            return -((self.cells - moves) // 2), self._Column(move & -move)
+        return best_score, best
+
+    def _NonLosingMoves(self, current, mask):
+        """Return the moves that do not hand the opponent an immediate win."""
+        possible = self._Possible(mask)
+        opponent_wins = self._WinningCells(current ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return 0  # Two threats: the opponent wins next move whatever we do
+            possible = forced
+        return possible & ~(opponent_wins >> 1)  # Never play directly below an opponent threat
+
+    def _OrderedMoves(self, current, mask, candidates, first):
+        scored = []
+        for index, col in enumerate(self.order):
+            move = candidates & self.column_masks[col]
+            if move:
+                threats = self._WinningCells(current | move, mask | move).bit_count()
+                scored.append((col != first, -threats, index, move))
+        return [move for *_, move in sorted(scored)]
+
+    def _Negamax(self, current, mask, moves, alpha, beta, depth):
+        """Return the score of the position for the side to move, which cannot win immediately."""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % TIME_CHECK_INTERVAL == 0 and \
+                time.perf_counter() > self.deadline:
+            raise _Timeout()
+
+        candidates = self._NonLosingMoves(current, mask)
+        if not candidates:
+            return -((self.cells - moves) // 2)
+        if moves >= self.cells - 2:
+            return 0  # Neither side can win in the last two moves
+
+        # Bound the window by the fastest possible loss and win
+        alpha = max(alpha, -((self.cells - 2 - moves) // 2))
+        beta = min(beta, (self.cells - 1 - moves) // 2)
+        if alpha >= beta:
+            return alpha
+        if depth <= 0:
+            return 0  # Horizon reached: unknown, scored as a draw
+
+        key = current + mask  # Unique per position thanks to the sentinel row
+        slot = key % self.table_size
+        entry = self.entries[slot] if self.keys[slot] == key else None
+        first = None
+        if entry is not None:
+            entry_depth, value, bound, first = entry
+            if entry_depth >= depth:
+                if bound == EXACT:
+                    return value
+                if bound == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        original_alpha = alpha
+        best_score, best = -self.cells, first
+        for move in self._OrderedMoves(current, mask, candidates, first):
+            score = -self._Negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha, depth - 1)
+            if score > best_score:
+                best_score, best = score, self._Column(move)
+            if score >= beta:
+                break
+            alpha = max(alpha, score)
+
+        bound = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.keys[slot] = key
+        self.entries[slot] = (depth, best_score, bound, best)
+        return best_score
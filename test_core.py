@@ -0,0 +1,723 @@
+import gc
+import os
+import random
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+from board import Board, PLAYER_INDEX
+from solver import Solver
+from q_table import MappedQTable
+from q_agent import QAgent
+from checkpoint import Checkpointer
+from file_reader import File_Reader, InvalidPosition
+from batch_moves import SelectMove
+from move_server import MoveServer
+from profiling import Profiler
+from metrics import FileMetricsSink, ReadMetrics
+from rollout_policy import (RolloutPolicy, WinBlockRollout, CenterWeightedRollout, TableRollout, RLRollout,
+                            MakeRolloutPolicy)
+from uct_tree import uct_tree
+from uct_store import NodeStore, ArrayNodeStore
+from dummy_rl_policy import Dummy_RL_Policy
+from vector_env import VectorBoard
+from dqn_agent import ReplayBuffer, VectorCollector, NumpyDQNPolicy, NumpyWeightsPath
+from tournament import EloRatings
+from benchmark import RunBenchmarks, Compare
+from opening_book import BookKey, BuildOpeningBook, EnumeratePositions, OpeningBook
+
+
+class GridBoard:
+    """The original list-of-lists board, kept as the reference for Board's semantics."""
+
+    def __init__(self, rows=6, cols=7):
+        self.rows, self.cols = rows, cols
+        self.board = [['O'] * cols for _ in range(rows)]
+
+    def AvailableColumns(self):
+        return [col for col in range(self.cols) if self.board[0][col] == 'O']
+
+    def AvailableRowInColumn(self, column):
+        for row in reversed(range(self.rows)):
+            if self.board[row][column] == 'O':
+                return row
+        return -1
+
+    def CheckWin(self, player):
+        lines = ((0, 1), (1, 0), (1, 1), (1, -1))
+        for r in range(self.rows):
+            for c in range(self.cols):
+                for dr, dc in lines:
+                    cells = [(r + i * dr, c + i * dc) for i in range(4)]
+                    if all(0 <= y < self.rows and 0 <= x < self.cols and self.board[y][x] == player
+                           for y, x in cells):
+                        return True
+        return False
+
+
+def RandomGames(count, rows=6, cols=7, seed=0):
+    """Yield (Board, GridBoard) pairs after every move of count random games."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        board, grid = Board(rows, cols), GridBoard(rows, cols)
+        turn = 'R'
+        while grid.AvailableColumns():
+            col = rng.choice(grid.AvailableColumns())
+            grid.board[grid.AvailableRowInColumn(col)][col] = turn
+            won = board.play(col, turn)
+            yield board, grid
+            if won:
+                break
+            turn = 'Y' if turn == 'R' else 'R'
+
+
+@pytest.mark.parametrize('rows, cols', [(6, 7), (5, 4), (7, 9)])
+def test_board_matches_grid(rows, cols):
+    for board, grid in RandomGames(30, rows, cols):
+        assert board.board == grid.board
+        assert board.AvailableColumns() == grid.AvailableColumns()
+        assert [board.AvailableRowInColumn(c) for c in range(cols)] == \
+            [grid.AvailableRowInColumn(c) for c in range(cols)]
+        for player in ('R', 'Y'):
+            assert board.CheckWin(player) == grid.CheckWin(player)
+
+
+def test_board_grid_assignment_round_trips():
+    for board, grid in RandomGames(10, seed=1):
+        copy = Board()
+        copy.board = [list(row) for row in grid.board]
+        assert copy.board == grid.board
+        assert copy.hash == board.hash and copy.heights == board.heights
+
+
+def test_board_accepts_numpy_columns():
+    board = Board()
+    board.board[5][np.int64(2)] = 'Y'
+    board.play(np.int64(3), 'R')
+    board.undo(np.int64(3))
+    board.play(np.int64(4), 'R')
+    assert all(type(value) is int for value in (*board.bitboards, board.hash, board.mirror_hash))
+    assert board.board[np.int64(5)][2] == 'Y' and board.board[5][4] == 'R'
+
+
+def test_board_rejects_bad_columns_and_out_of_order_undo():
+    board = Board()
+    for col in (7, -8):
+        with pytest.raises(IndexError):
+            board.board[5][col]
+        with pytest.raises(IndexError):
+            board.board[5][col] = 'R'
+    assert board.board[5][-1] == 'O'
+    board.play(2, 'R')
+    board.play(4, 'Y')
+    with pytest.raises(ValueError):
+        board.undo(2)
+    assert board.moves == [2, 4] and board.heights[2] == 1
+    board.undo(4)
+    board.undo(2)
+    assert board.moves == [] and board.bitboards == [0, 0]
+
+
+def test_play_undo_restores_hashes():
+    rng = random.Random(2)
+    board = Board()
+    history = [(board.hash, board.mirror_hash)]
+    for _ in range(20):
+        board.play(rng.choice(board.AvailableColumns()))
+        history.append((board.hash, board.mirror_hash))
+    while board.moves:
+        history.pop()
+        board.undo()
+        assert (board.hash, board.mirror_hash) == history[-1]
+
+
+def test_mirror_hash():
+    for board, _ in RandomGames(20, seed=3):
+        mirror = Board()
+        for col in board.moves:
+            mirror.play(board.MirrorColumn(col))
+        assert mirror.hash == board.mirror_hash and mirror.mirror_hash == board.hash
+        assert mirror.CanonicalKey()[0] == board.CanonicalKey()[0]
+
+
+def Negamax(board, player, alpha=None, beta=None):
+    """Alpha-beta negamax returning the solver's score for player to move.
+
+    With the default full window the score is exact, so it is an
+    independent reference for Solver, which adds ordering and a table.
+    """
+    cells = board.rows * board.cols
+    alpha = -cells if alpha is None else alpha
+    beta = cells if beta is None else beta
+    opponent = 'Y' if player == 'R' else 'R'
+    moves = sum(board.heights)
+    columns = board.AvailableColumns()
+    if not columns:
+        return 0
+    for col in columns:
+        won = board.play(col, player)
+        board.undo(col)
+        if won:
+            return (cells + 1 - moves) // 2
+    for col in sorted(columns, key=lambda col: abs(2 * col - (board.cols - 1))):
+        board.play(col, player)
+        score = -Negamax(board, opponent, -beta, -alpha)
+        board.undo(col)
+        if score >= beta:
+            return score
+        alpha = max(alpha, score)
+    return alpha
+
+
+@pytest.mark.parametrize('rows, cols, plies', [(4, 4, 4), (4, 5, 7), (5, 4, 7), (6, 7, 30)])
+def test_solver_matches_brute_force(rows, cols, plies):
+    rng = random.Random(rows * cols + plies)
+    solver = Solver(rows, cols)
+    checked = 0
+    while checked < 8:
+        board = Board(rows, cols)
+        if any(board.play(rng.choice(board.AvailableColumns())) for _ in range(plies)) or not board.AvailableColumns():
+            continue
+        player = 'R' if sum(board.heights) % 2 == 0 else 'Y'
+        expected = Negamax(board, player)
+        solver.clear()
+        move = solver.search(board, player)
+        assert solver.stats['score'] == expected
+        # The chosen move must reach that score
+        opponent = 'Y' if player == 'R' else 'R'
+        won = board.play(move, player)
+        assert ((rows * cols + 1 - sum(board.heights) + 1) // 2 if won else -Negamax(board, opponent)) == expected
+        checked += 1
+
+
+def test_mapped_q_table_grows_and_looks_up(tmp_path):
+    path = str(tmp_path / 'q.bin')
+    table = MappedQTable(path, capacity=16)
+    rng = random.Random(4)
+    expected = {}
+    for _ in range(2000):
+        key = rng.getrandbits(64)
+        expected[key] = {rng.randrange(7): rng.random()}
+        table[key] = expected[key]
+    assert table.capacity > 16 and len(table) == len(expected)
+    assert all(dict(table[key]) == pytest.approx(row) for key, row in expected.items())  # Stored as float32
+    keys = np.array(list(expected), dtype=np.uint64)
+    assert (table.Lookup(keys) >= 0).all()
+    absent = np.array([key for key in range(1000) if key not in expected], dtype=np.uint64)
+    assert (table.Lookup(absent) == -1).all()
+
+    deleted = list(expected)[::3]
+    for key in deleted:
+        del table[key]
+        del expected[key]
+    with pytest.raises(KeyError):
+        del table[deleted[0]]
+    table.flush()
+    reopened = MappedQTable(path, mode='r')
+    assert len(reopened) == len(expected)
+    assert all(dict(reopened[key]) == pytest.approx(row) for key, row in expected.items())
+    assert all(key not in reopened for key in deleted)
+    assert sorted(reopened.keys()) == sorted(expected) and len(list(reopened.values())) == len(expected)
+
+
+def test_checkpointer_loads_delta_chain(tmp_path):
+    with Checkpointer(str(tmp_path), full_every=3) as checkpointer:
+        for number in range(5):
+            full = checkpointer.needs_full()
+            checkpointer.save(lambda n=number: {'x': np.arange(n)}, {'number': number}, full)
+    chain = Checkpointer(str(tmp_path), full_every=3).load()
+    assert [state['number'] for _, state in chain] == [3, 4]
+    assert chain[-1][0]['x'].tolist() == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def test_q_learning_resume_is_exact(tmp_path, mapped):
+    def Train(name, episodes, checkpointer=None):
+        table = MappedQTable(str(tmp_path / name)) if mapped else None
+        agent = QAgent(Q_table=table, epsilon=0.3, rng=random.Random(5))
+        agent.TrainQLearning('R', 1, Board(), num_simulations=episodes, output_type=None, eval_every=10 ** 9,
+                             checkpoint=checkpointer, checkpoint_every=40)
+        return agent
+
+    random.seed(1)
+    np.random.seed(1)
+    straight = Train('straight.bin', 200)
+
+    random.seed(1)
+    np.random.seed(1)
+    with Checkpointer(str(tmp_path / 'checkpoints'), full_every=2) as checkpointer:
+        Train('resumed.bin', 130, checkpointer)
+    random.seed(99)  # Resuming must restore the generators, whatever state they are in
+    with Checkpointer(str(tmp_path / 'checkpoints'), full_every=2) as checkpointer:
+        resumed = Train('resumed.bin', 200, checkpointer)
+
+    def Rows(agent):
+        return {key: dict(row) for key, row in agent.Q_table.items()}
+
+    assert Rows(resumed) == Rows(straight)
+
+
+def test_parallel_q_learning_is_reproducible(tmp_path):
+    def Train(name):
+        random.seed(6)
+        agent = QAgent(Q_table=MappedQTable(str(tmp_path / name), capacity=64), epsilon=0.3)
+        agent.TrainQLearningParallel('R', 600, Board(), workers=2, episodes_per_task=100)
+        return {key: dict(row) for key, row in agent.Q_table.items()}
+
+    assert Train('first.bin') == Train('second.bin')
+
+
+def test_snapshot_agent_ignores_later_training(tmp_path):
+    agent = QAgent(Q_table=MappedQTable(str(tmp_path / 'q.bin')), epsilon=0.3, rng=random.Random(7))
+    for _ in range(50):
+        agent.ApplyHistory(agent.PlayEpisode('R', Board()))
+    snapshot = agent.SnapshotAgent()
+    before = {key: dict(row) for key, row in snapshot.Q_table.items()}
+    for _ in range(50):
+        agent.ApplyHistory(agent.PlayEpisode('R', Board()))
+    assert {key: dict(row) for key, row in snapshot.Q_table.items()} == before
+    assert len(agent.Q_table) > len(before)
+    del snapshot
+    gc.collect()
+    assert os.listdir(tmp_path) == ['q.bin']  # The snapshot's copy is removed with it
+
+
+def test_read_positions_resumes_after_bad_block(tmp_path):
+    empty = ['OOOOOOO'] * 6
+    path = tmp_path / 'positions.txt'
+    path.write_text('\n'.join(['AB', 'R', *empty, '', 'UCT', 'Y', *empty[1:], '', 'AB', 'r', *empty, '',
+                               '{"algorithm": "AB", "player": "Y", "board": ["OOOO", "OOOO", "OOOO", "OOOO"]}',
+                               'AB']) + '\n')
+    positions = list(File_Reader(str(path)).read_positions())
+    assert [position[:2] for position in positions] == [('AB', 'R'), ('UCT', 'Y'), ('AB', 'r'), ('AB', 'Y'),
+                                                        ('AB', None)]
+    assert [isinstance(position[2], InvalidPosition) for position in positions] == [False, True, False, False, True]
+    assert SelectMove(*positions[2])['move'] is not None
+
+
+def test_move_server_coalesces_only_batched_agents():
+    server = MoveServer({'AB': 'AB:time_budget_ms=50'}, workers=2)
+    try:
+        batch = [((algorithm, 'R', None), index) for index, algorithm in
+                 enumerate(['ab', 'DQN', 'UCT', 'dqn', None, ['AB']])]
+        groups = server._Split(batch)
+    finally:
+        server.close()
+    assert sorted(sorted(index for _, index in group) for group in groups) == [[0], [1, 3], [2], [4], [5]]
+
+
+def test_profiler_watches_an_attribute_once():
+    class Model:
+        def predict(self, x):
+            return x
+
+    model = Model()
+    profiler = Profiler().enable()
+    for _ in range(3):  # As repeated training runs do
+        profiler.watch(model, 'predict', 'predicts')
+    model.predict(1)
+    assert profiler.counts['predicts'] == 1
+    profiler.disable()
+    assert 'predict' not in vars(model) and model.predict(2) == 2
+
+
+def test_read_positions_splits_back_to_back_blocks(tmp_path):
+    empty = ['OOOOOOO'] * 6
+    path = tmp_path / 'positions.txt'
+    path.write_text('\n'.join(['AB', 'R', *empty, 'UCT', 'Y', *empty[1:], 'QL', 'y', *empty,
+                               '{"algorithm": "UR", "player": "R", "board": ["OOOO", "OOOO", "OOOO", "OOOO"]}',
+                               'AB', 'Y', 'ROOOOOO', *empty[1:]]) + '\n')
+    positions = list(File_Reader(str(path)).read_positions())
+    assert [position[:2] for position in positions] == [('AB', 'R'), ('UCT', 'Y'), ('QL', 'y'), ('UR', 'R'),
+                                                        ('AB', 'Y')]
+    assert [isinstance(position[2], InvalidPosition) for position in positions] == [False, True, False, False, False]
+    assert len(positions[3][2]) == 4 and positions[4][2][0] == list('ROOOOOO')
+
+
+def test_csv_metrics_keep_every_key(tmp_path):
+    path = str(tmp_path / 'metrics.csv')
+    with FileMetricsSink(path) as sink:
+        sink.record(episode=0, reward=1, epsilon=0.1)
+        sink.record(episode=0, win_rate=0.5)
+        sink.record(episode=1, reward=-1, epsilon=0.1, win_checks=12)
+    with FileMetricsSink(path) as sink:  # Appending to an existing file keeps its columns
+        sink.record(episode=2, reward=0, epsilon=0.1)
+    records = ReadMetrics(path)
+    assert [record['episode'] for record in records] == [0, 0, 1, 2]
+    assert [record['win_rate'] for record in records] == ['', 0.5, '', '']
+    assert records[2]['win_checks'] == 12 and records[1]['reward'] == ''
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def test_parallel_q_learning_fills_table(tmp_path, mapped):
+    random.seed(8)
+    table = MappedQTable(str(tmp_path / 'q.bin'), capacity=64) if mapped else None
+    agent = QAgent(Q_table=table, epsilon=0.3)
+    result = agent.TrainQLearningParallel('R', 500, Board(), workers=2, episodes_per_task=60)
+    assert result['episodes'] == 500
+    empty = Board().CanonicalKey()[0]
+    assert len(agent.Q_table) > 50 and empty in agent.Q_table
+    assert sorted(name for name in os.listdir(tmp_path)) == (['q.bin'] if mapped else [])  # Snapshots removed
+
+
+def test_win_block_rollout_keeps_to_its_ply_budget():
+    class Fallback(RolloutPolicy):
+        def select(self, board, turn, ply=0):
+            return board.AvailableColumns()[-1]
+
+    board = Board()
+    for col in (0, 6, 0, 6, 0):
+        board.play(col)
+    policy = WinBlockRollout(fallback=Fallback(), max_plies=2)
+    assert policy.select(board, 'Y', ply=1) == 0  # Blocks R's four within the budget
+    assert policy.select(board, 'Y', ply=2) == 6  # Past it, the fallback plays
+
+
+def WinInOne():
+    """Return a board where red, to move, wins by playing column 0."""
+    board = Board()
+    for col in (0, 6, 0, 6, 0, 5):
+        board.play(col)
+    return board
+
+
+def test_uct_finds_win_and_restores_board():
+    random.seed(9)
+    np.random.seed(9)
+    board = WinInOne()
+    before = (board.hash, board.mirror_hash, list(board.moves), list(board.heights))
+    tree = uct_tree('R', Dummy_RL_Policy(), board, num_simulations=300)
+    assert tree.search(board) == 0
+    assert tree.stats['simulations'] == 300
+    assert (board.hash, board.mirror_hash, board.moves, board.heights) == before
+
+
+def GrowTree(store, simulations, seed, depth=3):
+    """Run select/expand/backpropagate on store with random rewards; return the root and the moves chosen."""
+    random.seed(seed)
+    rewards = random.Random(seed)
+    root = store.new_node('R', list(range(store.cols)))
+    chosen = []
+    for _ in range(simulations):
+        node, path = root, [root]
+        for _ in range(depth):
+            player = 'Y' if store.player(node) == 'R' else 'R'
+            if not store.is_fully_expanded(node):
+                move = store.pop_untried_move(node)
+                child = store.add_child(node, move, player, list(range(store.cols)))
+                if child is None:
+                    break
+                node = child
+            elif store.children(node):
+                move, node = store.best_child(node)
+            else:
+                break  # Every move was tried while the store was full
+            chosen.append(move)
+            path.append(node)
+        store.backpropagate(path, rewards.uniform(-1, 1), 'R')
+    return root, chosen
+
+
+def Shape(store, node):
+    return {move: (visits, Shape(store, store.children(node)[move]))
+            for move, visits in sorted(store.child_visits(node).items())}
+
+
+def test_array_store_matches_object_store():
+    nodes, array = NodeStore(cols=4), ArrayNodeStore(cols=4, chunk_size=4)  # The arrays grow many times
+    root, chosen = GrowTree(nodes, 300, seed=10)
+    array_root, array_chosen = GrowTree(array, 300, seed=10)
+    assert array_chosen == chosen
+    assert Shape(array, array_root) == Shape(nodes, root)
+    assert array.size == nodes.size and array.capacity >= array.size
+
+    # Compacting to one subtree keeps its statistics and renumbers it densely
+    keep, stack = set(), [array.children(array_root)[2]]
+    while stack:
+        node = stack.pop()
+        keep.add(node)
+        stack.extend(array.children(node).values())
+    remap = array.compact(keep)
+    assert array.size == len(keep) and sorted(remap.values()) == list(range(len(keep)))
+    assert Shape(array, remap[min(keep)]) == Shape(nodes, nodes.children(root)[2])
+
+    # Full stores stop adding children
+    limited, limited_array = NodeStore(cols=4, max_nodes=20), ArrayNodeStore(cols=4, max_nodes=20, chunk_size=8)
+    GrowTree(limited, 100, seed=11)
+    GrowTree(limited_array, 100, seed=11)
+    assert limited.size == limited_array.size == 20
+    assert limited.add_child(None, 0, 'R', [0]) is None and limited_array.add_child(0, 0, 'R', [0]) is None
+
+
+@pytest.mark.parametrize('store', ['object', 'array'])
+def test_uct_reuses_subtree_after_reroot(store):
+    random.seed(12)
+    np.random.seed(12)
+    board = Board()
+    tree = uct_tree('R', Dummy_RL_Policy(), board, num_simulations=500, store=store)
+    board.play(tree.search(board), 'R')
+    replies = tree.store.child_visits(tree.table[tree.StateKey(board, 'Y')])
+    reply = max(replies, key=replies.get)
+    board.play(board.MirrorColumn(reply) if board.CanonicalKey()[1] else reply, 'Y')
+
+    def Visits(node):  # Mirror-image moves of a symmetric position share one child
+        children, visits = tree.store.children(node), tree.store.child_visits(node)
+        return sum({children[move]: count for move, count in visits.items()}.values())
+
+    kept = tree.table[tree.StateKey(board, 'R')]
+    visits, reused, size = tree.store.child_visits(kept), Visits(kept), tree.store.size
+    root = tree.set_root(board)
+    assert reused > 0 and tree.store.child_visits(root) == visits
+    assert tree.store.size < size and len(tree.table) <= tree.store.size
+    tree.search(board)
+    assert tree.root == root and Visits(root) == reused + 500
+
+
+@pytest.mark.parametrize('parallel', ['leaf', 'root'])
+def test_parallel_uct_finds_win(parallel):
+    random.seed(13)
+    np.random.seed(13)
+    board = WinInOne()
+    moves = list(board.moves)
+    tree = uct_tree('R', Dummy_RL_Policy(), board, num_simulations=300, parallel=parallel, workers=2)
+    try:
+        assert tree.search(board) == 0
+    finally:
+        tree.close()
+    assert tree.stats['simulations'] == 300 and board.moves == moves
+    with pytest.raises(ValueError):
+        uct_tree('R', Dummy_RL_Policy(), board, parallel='tree')
+
+
+def test_uct_time_budget_and_early_stop():
+    random.seed(14)
+    np.random.seed(14)
+    board = Board()
+    tree = uct_tree('R', Dummy_RL_Policy(), board, num_simulations=10 ** 9)
+    assert tree.search(board, time_budget_ms=50) in board.AvailableColumns()
+    assert tree.stats['simulations'] > 0 and tree.stats['elapsed'] < 1.0
+
+    board = WinInOne()
+    tree = uct_tree('R', Dummy_RL_Policy(), board, num_simulations=5000)
+    assert tree.search(board, early_stop=True) == 0
+    assert tree.stats['stopped_early'] and tree.stats['simulations'] < 5000
+
+
+def test_batched_uct_evaluates_in_batches():
+    class CountingPolicy(Dummy_RL_Policy):
+        def __init__(self):
+            self.single, self.batches = 0, []
+
+        def predict(self, board):
+            self.single += 1
+            return super().predict(board)
+
+        def predict_batch(self, boards):
+            self.batches.append(len(boards))
+            return super().predict_batch(boards)
+
+    random.seed(15)
+    np.random.seed(15)
+    board = WinInOne()
+    policy = CountingPolicy()
+    tree = uct_tree('R', policy, board, num_simulations=200, eval_batch_size=8)
+    assert tree.search(board) == 0
+    assert tree.stats['simulations'] == 200
+    assert policy.single == 0 and max(policy.batches) == 8
+
+
+@pytest.mark.parametrize('rows, cols', [(6, 7), (5, 4)])
+def test_vector_board_matches_board(rows, cols):
+    rng = np.random.RandomState(16)
+    start = Board(rows, cols)
+    start.play(cols // 2, 'R')
+    env = VectorBoard(32, rows, cols, first_player=2, auto_reset=False, start=start)
+    boards = [start.copy() for _ in range(32)]
+    while not env.done.all():
+        actions = env.random_actions(rng)
+        turns = ['R' if turn == 1 else 'Y' for turn in env.turn]
+        active = ~env.done
+        winner, done = env.step(actions)
+        for i in np.flatnonzero(active):
+            won = boards[i].play(actions[i], turns[i])
+            assert winner[i] == (PLAYER_INDEX[turns[i]] + 1 if won else 0)
+            assert done[i] == (won or not boards[i].AvailableColumns())
+        assert not done[~active].any()
+        assert env.hashes.tolist() == [board.hash for board in boards]
+        assert env.mirror_hashes.tolist() == [board.mirror_hash for board in boards]
+        assert env.canonical_keys()[0].tolist() == [board.CanonicalKey()[0] for board in boards]
+        assert env.heights.tolist() == [board.heights for board in boards]
+    assert all(env.ToBoard(i).board == board.board for i, board in enumerate(boards))
+    assert not env.legal_moves().any()
+
+    # With auto_reset, finished boards go back to start at once
+    env = VectorBoard(8, rows, cols, start=start)
+    for _ in range(rows * cols):
+        _, done = env.step(env.random_actions(rng))
+        assert (env.hashes[done] == start.hash).all() and not env.done.any()
+
+
+def test_replay_buffer_wraps_around_and_samples():
+    memory = ReplayBuffer(5, 2)
+    for i in range(3):
+        memory.add([i, -i], i % 7, float(i), [i + 1, -i], i == 2)
+    memory.add_batch(np.array([[i, -i] for i in range(3, 8)]), np.arange(3, 8) % 7, np.arange(3, 8.0),
+                     np.array([[i + 1, -i] for i in range(3, 8)]), np.zeros(5, dtype=bool))
+    assert (len(memory), memory.position, memory.total) == (5, 3, 8)
+    assert memory.rewards.tolist() == [5, 6, 7, 3, 4]  # The three oldest were overwritten
+    assert memory.states[:, 0].tolist() == memory.rewards.tolist()
+    assert memory.slots_since(6).tolist() == [1, 2] and memory.slots_since(0).tolist() == list(range(5))
+
+    np.random.seed(17)
+    states, actions, rewards, next_states, dones = memory.sample(5)
+    assert sorted(rewards.tolist()) == [3, 4, 5, 6, 7]  # Without replacement, from the filled slots only
+    assert (states[:, 0] == rewards).all() and (next_states[:, 0] == rewards + 1).all()
+    assert (actions == rewards.astype(int) % 7).all() and not dones.any()
+
+    memory = ReplayBuffer(10, 2)
+    memory.add([1, 1], 0, 1.0, [1, 1], False)
+    memory.add([2, 2], 0, 2.0, [2, 2], False)
+    for _ in range(20):
+        assert set(memory.sample(2)[2].tolist()) == {1.0, 2.0}
+    with pytest.raises(ValueError):
+        memory.sample(3)
+
+
+def test_vector_collector_stores_one_transition_per_game():
+    class LowestColumnAgent:
+        def __init__(self):
+            self.memory = ReplayBuffer(10000, 42)
+
+        def act_batch(self, states, legal):
+            assert legal.any(axis=1).all()  # Finished games are reset before the agent moves again
+            return np.argmax(legal, axis=1)
+
+    np.random.seed(18)
+    agent = LowestColumnAgent()
+    collector = VectorCollector(agent, 1, Board(), 16)
+    finished = sum(collector.step() for _ in range(30))
+    memory = agent.memory
+    assert len(memory) == 30 * 16 and finished == memory.dones.sum() == len(collector.episode_rewards)
+    assert set(collector.episode_rewards) <= {10.0, -10.0, 0.0} and 10.0 in collector.episode_rewards
+    n = len(memory)
+    states, actions, rewards, next_states, dones = (memory.states[:n], memory.actions[:n], memory.rewards[:n],
+                                                    memory.next_states[:n], memory.dones[:n])
+    assert (states[np.arange(n), actions] == 0).all()  # The top cell of every chosen column was free
+    played = (next_states != 0).sum(axis=1) - (states != 0).sum(axis=1)
+    assert (played[~dones] == 2).all() and (played >= 1).all()  # Agent move plus the opponent's reply
+    assert (rewards[~dones] == 0).all()
+
+
+def test_numpy_dqn_policy_forward_pass(tmp_path):
+    rng = np.random.RandomState(19)
+    weights = [rng.randn(42, 24), rng.randn(24), rng.randn(24, 24), rng.randn(24), rng.randn(24, 7), rng.randn(7)]
+    path = str(tmp_path / 'weights.npz')
+    np.savez(path, **{f"w{i}": w for i, w in enumerate(weights)})
+    policy = NumpyDQNPolicy.load(path)
+    states = rng.randint(0, 3, size=(5, 42)).astype(np.float32)
+    hidden = np.maximum(np.maximum(states @ weights[0] + weights[1], 0) @ weights[2] + weights[3], 0)
+    expected = hidden @ weights[4] + weights[5]
+    assert np.allclose(policy.predict(states), expected, rtol=1e-4, atol=1e-4)
+    assert np.allclose(policy.predict(states[0]), expected[0], rtol=1e-4, atol=1e-4)
+    legal = np.arange(7) != np.argmax(expected[0])
+    assert policy.act(states[0]) == np.argmax(expected[0])
+    assert policy.act(states[0], legal) == np.argmax(np.where(legal, expected[0], -np.inf))
+
+
+def test_numpy_dqn_policy_matches_keras_model(tmp_path):
+    pytest.importorskip('tensorflow')
+    from dqn_agent import DQNAgent
+
+    agent = DQNAgent(42, 7)
+    agent.save(str(tmp_path / 'dqn.weights.h5'))
+    policy = NumpyDQNPolicy.load(NumpyWeightsPath(str(tmp_path / 'dqn.weights.h5')))
+    states = np.random.RandomState(20).randint(0, 3, size=(8, 42)).astype(np.float32)
+    expected = np.array(agent.model.predict_on_batch(states))
+    assert np.allclose(policy.predict(states), expected, rtol=1e-4, atol=1e-4)
+    assert np.allclose(NumpyDQNPolicy.FromAgent(agent).predict(states), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_elo_ratings_fit_a_known_win_matrix():
+    true = np.array([0.0, 100.0, 250.0])
+    results = []
+    for i in range(3):
+        for j in range(i + 1, 3):
+            expected = 1 / (1 + 10 ** ((true[i] - true[j]) / 400))  # Score of j against i
+            # Three games whose scores plus the pair's virtual draw give exactly that expected score
+            results += [(j, i, (4 * expected - 0.5) / 3)] * 3
+    assert EloRatings(3, results, anchor=0) == pytest.approx(true, abs=1e-3)
+    assert EloRatings(3, results) == pytest.approx(true - true.mean(), abs=1e-3)
+
+    # An undefeated agent still gets a finite rating
+    ratings = EloRatings(2, [(0, 1, 1.0)] * 10, anchor=1)
+    assert ratings[0] == pytest.approx(400 * np.log10(10.5 / 0.5))
+
+
+def test_benchmarks_report_and_compare():
+    report = RunBenchmarks(['board', 'uct_50', 'dqn_replay'], scale=0.05, repeat=2)
+    results = report['results']
+    assert report['meta']['repeat'] == 2 and set(results) == {'board', 'uct_50', 'dqn_replay'}
+    assert set(results['uct_50']) == {'simulations_per_sec', 'latency_p50_ms', 'latency_p90_ms', 'latency_p99_ms'}
+    assert all(value > 0 for value in results['board'].values())
+    with pytest.raises(ValueError):
+        RunBenchmarks(['boards'])
+
+    # Rates regress when they drop, latencies when they rise; small changes are noise
+    baseline = {'results': {'uct': {'simulations_per_sec': 1000.0, 'latency_p50_ms': 10.0, 'latency_p99_ms': 20.0},
+                            'q_learning': {'episodes_per_sec': 100.0}}}
+    current = {'results': {'uct': {'simulations_per_sec': 850.0, 'latency_p50_ms': 8.0, 'latency_p99_ms': 21.0},
+                           'q_learning': {'episodes_per_sec': 150.0}, 'dqn_replay': {'skipped': 'no TensorFlow'}}}
+    assert Compare(current, baseline) == ['uct.simulations_per_sec']
+    current['results']['uct']['latency_p99_ms'] = 25.0
+    assert Compare(current, baseline, tolerance=0.2) == ['uct.latency_p99_ms']
+
+
+def test_opening_book_round_trips(tmp_path):
+    path = str(tmp_path / 'book.bin')
+    BuildOpeningBook(path, max_plies=3, rows=4, cols=5, depth=6, workers=1, chunk_size=7)
+    book = OpeningBook(path)
+    positions = EnumeratePositions(3, rows=4, cols=5)
+    assert (book.rows, book.cols, book.plies, len(book)) == (4, 5, 3, len(positions))
+    assert (np.diff(book.keys.astype(np.float64)) > 0).all()  # Sorted for binary search
+    solver = Solver(4, 5)
+    for moves in positions:
+        board, mirror = Board(4, 5), Board(4, 5)
+        for col in moves:
+            board.play(col)
+            mirror.play(board.MirrorColumn(col))
+        player = 'R' if len(moves) % 2 == 0 else 'Y'
+        move, score = book.Lookup(board, player)
+        solver.clear()
+        solver.search(board, player, depth=6)
+        assert score == solver.stats['score'] and move in board.AvailableColumns()
+        assert book.Lookup(mirror, player) == (board.MirrorColumn(move), score)
+
+    deeper = Board(4, 5)
+    for col in (0, 1, 2, 3):
+        deeper.play(col)
+    assert book.Lookup(deeper, 'R') is None and book.Lookup(Board(), 'R') is None
+    (tmp_path / 'other.bin').write_bytes(b'not a book at all, just some bytes')
+    with pytest.raises(ValueError):
+        OpeningBook(str(tmp_path / 'other.bin'))
+
+
+def test_rollout_policies_play_only_legal_columns():
+    class FullColumnPolicy:  # Values full columns highest
+        def predict(self, board):
+            return np.array([10.0 if height == board.rows else float(col) for col, height in enumerate(board.heights)])
+
+    board = Board()
+    for col in (0, 3, 6):
+        for _ in range(board.rows):
+            board.play(col)
+    boards = [board] + [game.copy() for game, _ in RandomGames(5, seed=21) if game.AvailableColumns()][::7]
+    table = {BookKey(game, turn)[0]: 0 for game in boards for turn in 'RY'}  # Column 0 is full on board
+    policies = [MakeRolloutPolicy(name, FullColumnPolicy()) for name in ('rl', 'random', 'center', 'winblock')]
+    policies += [CenterWeightedRollout(weights=[100, 1, 1, 100, 1, 1, 100]), TableRollout(table),
+                 TableRollout(table, max_plies=1), RLRollout(FullColumnPolicy(), max_plies=1)]
+    random.seed(21)
+    for policy in policies:
+        for game in boards:
+            legal = game.AvailableColumns()
+            for turn in 'RY':
+                for ply in range(3):
+                    assert all(policy.select(game, turn, ply) in legal for _ in range(20))
+            assert all(move in board.AvailableColumns() for move in policy.select_batch([board] * 4, 'RYRY'))
@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np  # type: ignore
+from board import *
+from agents import MakeAgent, ParseSpec
+
+
+def MakeOpenings(count, plies, seed, rows=ROWS, cols=COLUMNS):
+    """Return count random openings of plies moves each, reproducible from seed.
+
+    Openings never end the game and are distinct up to mirror symmetry while
+    enough distinct ones exist.
+    """
+    rng = random.Random(seed)
+    openings, seen = [], set()
+    for attempt in range(count * 20):
+        if len(openings) == count:
+            break
+        board = Board(rows, cols)
+        moves = []
+        for _ in range(plies):
+            col = rng.choice(board.AvailableColumns())
+            if board.play(col):
+                break
+            moves.append(col)
+        if len(moves) < plies:
+            continue
+        key = board.CanonicalKey()[0]
+        if key in seen and attempt < count * 10:
+            continue
+        seen.add(key)
+        openings.append(moves)
+    while len(openings) < count:  # Fewer distinct openings than requested: repeat them
+        openings.append(openings[len(openings) % max(len(seen), 1)] if openings else [])
+    return openings
+
+
+def PlayGame(red, yellow, opening, rows=ROWS, cols=COLUMNS):
+    """Play one game from opening with red moving first and return (winner, plies).
+
+    winner is 'R', 'Y' or None for a draw. An illegal move loses the game.
+    """
+    board = Board(rows, cols)
+    for col in opening:
+        board.play(col)
+    agents = {'R': red, 'Y': yellow}
+    for player, agent in agents.items():
+        agent.reset(player)
+    player = 'R' if len(opening) % 2 == 0 else 'Y'
+    while board.AvailableColumns():
+        col = agents[player].SelectMove(board, player)
+        opponent = 'Y' if player == 'R' else 'R'
+        if col not in board.AvailableColumns():
+            return opponent, len(board.moves)
+        if board.play(col, player):
+            return player, len(board.moves)
+        player = opponent
+    return None, len(board.moves)
+
+
+def _MatchWorker(args):
+    """Play a chunk of openings between two agents, both colors each, and return the results.
+
+    Each result is (first, second, score) where score is the first agent's
+    points (1 win, 0.5 draw, 0 loss) for that game.
+    """
+    first, second, specs, openings, seed, shape = args
+    random.seed(seed)
+    np.random.seed(seed % (1 << 32))
+    agents = [MakeAgent(specs[first]), MakeAgent(specs[second])]
+    results, plies = [], 0
+    for opening in openings:
+        for red, yellow in ((0, 1), (1, 0)):
+            winner, length = PlayGame(agents[red], agents[yellow], opening, *shape)
+            plies += length
+            if winner is None:
+                score = 0.5
+            else:
+                score = 1.0 if (winner == 'R') == (red == 0) else 0.0
+            results.append((first, second, score))
+    return results, plies
+
+
+def EloRatings(num_agents, results, anchor=None, iterations=1000):
+    """Fit Bradley-Terry Elo ratings to (i, j, score) game results.
+
+    Every pair of agents also gets one virtual draw so that undefeated or
+    winless agents still have finite ratings. Ratings average 0, or place
+    the anchor agent at 0 when given.
+    """
+    results = np.asarray(results, dtype=float).reshape(-1, 3)
+    first, second, score = results[:, 0].astype(int), results[:, 1].astype(int), results[:, 2]
+    points = np.zeros((num_agents, num_agents))
+    np.add.at(points, (first, second), score)
+    np.add.at(points, (second, first), 1.0 - score)
+    points += 0.5 * (1 - np.eye(num_agents))  # Virtual draws
+    games = points + points.T
+    wins = points.sum(axis=1)
+    gamma = np.ones(num_agents)
+    for _ in range(iterations):
+        updated = wins / (games / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+        updated /= np.exp(np.mean(np.log(updated)))
+        converged = np.allclose(updated, gamma, rtol=1e-9)
+        gamma = updated
+        if converged:
+            break
+    ratings = 400.0 * np.log10(gamma)
+    return ratings - (ratings[anchor] if anchor is not None else ratings.mean())
+
+
+def EloIntervals(num_agents, results, anchor=None, samples=200, confidence=0.95, seed=0):
+    """Return (low, high) bootstrap confidence bounds for each agent's Elo rating."""
+    rng = np.random.default_rng(seed)
+    results = np.asarray(results, dtype=float).reshape(-1, 3)
+    ratings = np.array([EloRatings(num_agents, results[rng.integers(0, len(results), len(results))], anchor)
+                      for _ in range(samples)])
+    tail = (1.0 - confidence) / 2 * 100
+    return np.percentile(ratings, tail, axis=0), np.percentile(ratings, 100 - tail, axis=0)
+
+
+def RunTournament(specs, games_per_pair=100, opening_plies=2, seed=0, workers=None, chunk_size=10,
+                  rows=ROWS, cols=COLUMNS, anchor=None):
+    """Play a round robin between the agents in specs and return a report dict.
+
+    Every pair plays games_per_pair games: each seeded opening twice, once
+    with each agent moving first. Games are spread over a pool of worker
+    processes in chunks of chunk_size openings. The report holds the
+    win/draw/loss matrices (rows are the agent, columns the opponent), Elo
+    ratings with 95% bootstrap intervals and the throughput.
+    """
+    for spec in specs:
+        ParseSpec(spec)  # Fail on a bad spec before any process starts
+    num_agents = len(specs)
+    openings = MakeOpenings(max(1, games_per_pair // 2), opening_plies, seed, rows, cols)
+    rng = random.Random(seed)
+    tasks = [(i, j, specs, openings[k:k + chunk_size], rng.getrandbits(63), (rows, cols))
+             for i, j in itertools.combinations(range(num_agents), 2)
+             for k in range(0, len(openings), chunk_size)]
+
+    start = time.perf_counter()
+    results, plies = [], 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for future in as_completed([executor.submit(_MatchWorker, task) for task in tasks]):
+            chunk, chunk_plies = future.result()
+            results.extend(chunk)
+            plies += chunk_plies
+    elapsed = time.perf_counter() - start
+    results.sort()  # Completion order varies; keep the bootstrap reproducible
+
+    wins = np.zeros((num_agents, num_agents), dtype=int)
+    draws = np.zeros((num_agents, num_agents), dtype=int)
+    for i, j, score in results:
+        if score == 0.5:
+            draws[i, j] += 1
+            draws[j, i] += 1
+        elif score == 1.0:
+            wins[i, j] += 1
+        else:
+            wins[j, i] += 1
+    low, high = EloIntervals(num_agents, results, anchor, seed=seed)
+    return {'agents': list(specs), 'wins': wins, 'draws': draws, 'losses': wins.T.copy(),
+            'elo': EloRatings(num_agents, results, anchor), 'elo_low': low, 'elo_high': high,
+            'games': len(results), 'plies': plies, 'elapsed': elapsed,
+            'games_per_second': len(results) / elapsed if elapsed > 0 else 0.0}
+
+
+def PrintReport(report):
+    """Print the win/draw/loss matrix and the Elo table of a tournament report."""
+    names = report['agents']
+    width = max(12, max(len(name) for name in names) + 2)
+    print("Win/draw/loss (row agent vs column agent):")
+    print(' ' * width + ''.join(name.rjust(width) for name in names))
+    for i, name in enumerate(names):
+        cells = ['-' if i == j else f"{report['wins'][i, j]}/{report['draws'][i, j]}/{report['losses'][i, j]}"
+                 for j in range(len(names))]
+        print(name.ljust(width) + ''.join(cell.rjust(width) for cell in cells))
+
+    print("\nElo (95% interval):")
+    for i in np.argsort(-report['elo']):
+        print(f"{names[i].ljust(width)}{report['elo'][i]:8.1f}  "
+              f"[{report['elo_low'][i]:.1f}, {report['elo_high'][i]:.1f}]")
+    print(f"\n{report['games']} games in {report['elapsed']:.1f}s "
+          f"({report['games_per_second']:.1f} games/s, {report['plies'] / max(report['games'], 1):.1f} plies/game)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin tournament between Connect Four agents.")
+    parser.add_argument("agents", nargs="+",
+                        help="agent specs, e.g. UR UCT:num_simulations=400 QL:q_table_path=q.bin DQN:dqn_weights=w.npz AB:depth=8")
+    parser.add_argument("--games", type=int, default=100, help="games per pair of agents (half with each color)")
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves played before the agents take over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--anchor", default=None, help="agent spec whose Elo is fixed at 0")
+    args = parser.parse_args()
+    if len(args.agents) < 2:
+        parser.error("a tournament needs at least two agents")
+    anchor = args.agents.index(args.anchor) if args.anchor in args.agents else None
+    PrintReport(RunTournament(args.agents, args.games, args.opening_plies, args.seed, args.workers, anchor=anchor))
@@ -1,42 +1,48 @@
 from board import *
 import random
-import copy
 import math
 
 class UCT_Node:
-    def __init__(self, board, player, parent=None):
-        self.board = copy.deepcopy(board)
-        self.player = player
-        self.parent = parent
+    __slots__ = ('move', 'player', 'parent', 'children', 'visits', 'q_value',
+                 'untried_moves', 'terminal', 'q_values')
+
+    def __init__(self, player, moves, move=None, parent=None, terminal=False):
+        self.move = move  # Column played to reach this node from its first parent
+        self.player = player  # Player to move at this node
+        self.parent = parent  # First parent; transposed nodes can be reached from others
         self.children = {}
         self.visits = 0
         self.q_value = 0
-        self.untried_moves = board.AvailableColumns()
+        self.untried_moves = [] if terminal else moves
+        self.terminal = terminal or not moves
         self.q_values = None  # Store RL policy values
 
-    def expand(self, rl_policy):
+    def pop_untried_move(self):
+        """Remove and return a random move that has no child yet."""
         move = random.choice(self.untried_moves)
-        new_board = copy.deepcopy(self.board)
-        self.board.AvailableRowInColumn(move)
-        next_player = 'Y' if self.player == 'R' else 'R'
-        child_node = UCT_Node(new_board, next_player, parent=self)
-        child_node.q_values = rl_policy.predict(new_board)
-        self.children[move] = child_node
         self.untried_moves.remove(move)
-        return child_node
+        return move
+
+    def add_child(self, move, child_node):
+        """Attach child_node under move; with transpositions a node may have several parents."""
+        self.children[move] = child_node
 
     def best_child(self, c_param=1.4):
+        return self.best_move(c_param)[1]
+
+    def best_move(self, c_param=1.4):
+        """Return (move, child) for the child with the highest UCB score."""
         choices = []
         for move, child in self.children.items():
             exploit = child.q_value / (child.visits + 1e-8)
             explore = math.sqrt(math.log(self.visits + 1) / (child.visits + 1e-8))
             score = exploit + c_param * explore
             choices.append((score, move, child))
-        _, move, best = max(choices)
-        return best
+        _, move, best = max(choices, key=lambda choice: choice[:2])
+        return move, best
 
     def is_fully_expanded(self):
         return len(self.untried_moves) == 0
 
     def is_terminal(self):
-        return self.board.CheckWin('R') or self.board.CheckWin('Y') or not self.board.AvailableColumns()
+        return self.terminal
@@ -0,0 +1,227 @@
+import random
+import numpy as np  # type: ignore
+from uct_node import UCT_Node
+
+PLAYERS = ('R', 'Y')
+PLAYER_CODES = {'R': 0, 'Y': 1}
+
+
+class NodeStore:
+    """Tree store backed by UCT_Node objects; a node id is the node itself."""
+
+    def __init__(self, cols=7, max_nodes=None):
+        self.cols = cols
+        self.max_nodes = max_nodes
+        self.size = 0
+
+    def clear(self):
+        self.size = 0
+
+    def has_room(self):
+        return self.max_nodes is None or self.size < self.max_nodes
+
+    def new_node(self, player, moves, terminal=False):
+        self.size += 1
+        return UCT_Node(player, moves, terminal=terminal)
+
+    def add_child(self, node, move, player, moves, terminal=False):
+        """Create a child of node reached by move; None once the store is full."""
+        if not self.has_room():
+            return None
+        self.size += 1
+        child = UCT_Node(player, moves, move=move, parent=node, terminal=terminal)
+        node.add_child(move, child)
+        return child
+
+    def link(self, node, move, child):
+        """Attach an existing node (a transposition) as the child of node under move."""
+        node.add_child(move, child)
+
+    def pop_untried_move(self, node):
+        return node.pop_untried_move()
+
+    def set_q_values(self, node, q_values):
+        node.q_values = q_values
+
+    def best_child(self, node, c_param=1.4):
+        return node.best_move(c_param)
+
+    def player(self, node):
+        return node.player
+
+    def children(self, node):
+        return node.children
+
+    def is_terminal(self, node):
+        return node.is_terminal()
+
+    def is_fully_expanded(self, node):
+        return node.is_fully_expanded()
+
+    def add_virtual_loss(self, path, amount=1):
+        """Count amount pending losses on path so concurrent selections spread out; negative removes them."""
+        for node in path:
+            node.visits += amount
+            node.q_value -= amount
+
+    def backpropagate(self, path, reward, player):
+        """Credit each node on path from the point of view of the player who moved into it."""
+        for node in path:
+            node.visits += 1
+            node.q_value += reward if node.player != player else -reward
+
+    def child_visits(self, node):
+        return {move: child.visits for move, child in node.children.items()}
+
+    def compact(self, keep):
+        """Drop every node not in keep; unreachable objects are left to the garbage collector."""
+        self.size = len(keep)
+        return {node: node for node in keep}
+
+
+class ArrayNodeStore:
+    """Tree store keeping node statistics in preallocated NumPy arrays.
+
+    Nodes are integer ids into the arrays. Storage grows in chunks of
+    chunk_size nodes up to max_nodes; once full, add_child() returns None and
+    the search rolls out from the existing leaf instead of adding nodes.
+    """
+
+    def __init__(self, cols=7, max_nodes=None, chunk_size=65536):
+        self.cols = cols
+        self.max_nodes = max_nodes
+        self.chunk_size = chunk_size
+        self.capacity = 0
+        self.size = 0
+        self.visits = np.zeros(0, dtype=np.int64)
+        self.value = np.zeros(0, dtype=np.float64)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.move = np.zeros(0, dtype=np.int8)
+        self.players = np.zeros(0, dtype=np.int8)
+        self.terminal = np.zeros(0, dtype=bool)
+        self.untried = np.zeros(0, dtype=np.int32)  # Bit per column not yet expanded
+        self.child_ids = np.zeros((0, cols), dtype=np.int32)
+        self.q_values = np.zeros((0, cols), dtype=np.float32)  # RL policy values per node
+        self._grow()
+
+    def clear(self):
+        self.size = 0
+
+    def _arrays(self):
+        return ('visits', 'value', 'parent', 'move', 'players', 'terminal', 'untried', 'child_ids', 'q_values')
+
+    def _grow(self):
+        """Extend every array by one chunk; return False if max_nodes is reached."""
+        new_capacity = self.capacity + self.chunk_size
+        if self.max_nodes is not None:
+            new_capacity = min(new_capacity, self.max_nodes)
+        if new_capacity <= self.capacity:
+            return False
+        for name in self._arrays():
+            array = getattr(self, name)
+            grown = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.capacity] = array
+            setattr(self, name, grown)
+        self.capacity = new_capacity
+        return True
+
+    def has_room(self):
+        return self.size < self.capacity or self._grow()
+
+    def new_node(self, player, moves, terminal=False, parent=-1, move=-1):
+        if not self.has_room():
+            return None
+        node = self.size
+        self.size += 1
+        terminal = terminal or not moves
+        self.visits[node] = 0
+        self.value[node] = 0.0
+        self.parent[node] = parent
+        self.move[node] = move
+        self.players[node] = PLAYER_CODES[player]
+        self.terminal[node] = terminal
+        self.untried[node] = 0 if terminal else sum(1 << col for col in moves)
+        self.child_ids[node] = -1
+        self.q_values[node] = 0.0
+        return node
+
+    def add_child(self, node, move, player, moves, terminal=False):
+        """Create a child of node reached by move; None once the store is full."""
+        child = self.new_node(player, moves, terminal=terminal, parent=node, move=move)
+        if child is not None:
+            self.child_ids[node, move] = child
+        return child
+
+    def link(self, node, move, child):
+        """Attach an existing node (a transposition) as the child of node under move."""
+        self.child_ids[node, move] = child
+
+    def pop_untried_move(self, node):
+        """Remove and return a random move of node that has no child yet."""
+        untried = int(self.untried[node])
+        move = random.choice([col for col in range(self.cols) if untried >> col & 1])
+        self.untried[node] = untried & ~(1 << move)
+        return move
+
+    def set_q_values(self, node, q_values):
+        self.q_values[node] = q_values
+
+    def best_child(self, node, c_param=1.4):
+        columns = np.flatnonzero(self.child_ids[node] >= 0)
+        kids = self.child_ids[node, columns]
+        visits = self.visits[kids]
+        exploit = self.value[kids] / (visits + 1e-8)
+        explore = np.sqrt(np.log(self.visits[node] + 1) / (visits + 1e-8))
+        best = np.argmax(exploit + c_param * explore)
+        return int(columns[best]), int(kids[best])
+
+    def player(self, node):
+        return PLAYERS[self.players[node]]
+
+    def children(self, node):
+        return {int(move): int(self.child_ids[node, move]) for move in np.flatnonzero(self.child_ids[node] >= 0)}
+
+    def is_terminal(self, node):
+        return bool(self.terminal[node])
+
+    def is_fully_expanded(self, node):
+        return self.untried[node] == 0
+
+    def add_virtual_loss(self, path, amount=1):
+        """Count amount pending losses on path so concurrent selections spread out; negative removes them."""
+        nodes = np.asarray(path, dtype=np.int64)
+        self.visits[nodes] += amount
+        self.value[nodes] -= amount
+
+    def backpropagate(self, path, reward, player):
+        """Credit each node on path from the point of view of the player who moved into it."""
+        nodes = np.asarray(path, dtype=np.int64)
+        self.visits[nodes] += 1
+        self.value[nodes] += np.where(self.players[nodes] != PLAYER_CODES[player], reward, -reward)
+
+    def child_visits(self, node):
+        return {move: int(self.visits[child]) for move, child in self.children(node).items()}
+
+    def compact(self, keep):
+        """Move the nodes in keep to the front of the arrays and return {old id: new id}."""
+        keep = np.sort(np.asarray(list(keep), dtype=np.int64))
+        remap = np.full(self.size, -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        for name in self._arrays():
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        kept = self.child_ids[:len(keep)]
+        kept[:] = np.where(kept >= 0, remap[np.maximum(kept, 0)], -1)
+        parents = self.parent[:len(keep)]
+        parents[:] = np.where(parents >= 0, remap[np.maximum(parents, 0)], -1)
+        self.size = len(keep)
+        return {int(old): int(new) for old, new in zip(keep, remap[keep])}
+
+
+def MakeStore(store, cols=7, max_nodes=None):
+    """Build a tree store by name: "object" (UCT_Node objects) or "array" (NumPy arrays)."""
+    if store == "object":
+        return NodeStore(cols, max_nodes=max_nodes)
+    if store == "array":
+        return ArrayNodeStore(cols, max_nodes=max_nodes)
+    raise ValueError(f"Unknown tree store: {store}. Valid stores: 'object', 'array'.")
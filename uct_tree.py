@@ -1,85 +1,429 @@
-from uct_node import UCT_Node
+from uct_store import MakeStore
+from board import TURN_KEY
+from rollout_policy import MakeRolloutPolicy, PredictBatch
+from concurrent.futures import ProcessPoolExecutor
+import os
 import random
+import time
 import numpy as np  # type: ignore
-import copy
+
+PARALLEL_MODES = (None, "root", "leaf")
+EARLY_STOP_INTERVAL = 32  # Simulations between checks for an unassailable leading move
+
+
+def _SeedWorker(seed):
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+
+
+def _RootSearchWorker(args):
+    """Run an independent search in a worker process and return its root visit counts, simulations and early stop."""
+    player, rl_policy, board, num_simulations, store, time_budget_ms, early_stop, seed, rollout_policy = args
+    _SeedWorker(seed)
+    tree = uct_tree(player, rl_policy, board, num_simulations=num_simulations, store=store,
+                    rollout_policy=rollout_policy)
+    tree.search(board, time_budget_ms=time_budget_ms, early_stop=early_stop)
+    return tree.root_child_visits(board), tree.stats['simulations'], tree.stats['stopped_early']
+
+
+def _RolloutWorker(args):
+    """Play out a batch of (board, player to move) leaves in a worker process."""
+    player, rl_policy, leaves, seed, rollout_policy = args
+    _SeedWorker(seed)
+    tree = uct_tree(player, rl_policy, leaves[0][0], num_simulations=0, rollout_policy=rollout_policy)
+    return tree.batch_rollout([board for board, _ in leaves], [turn for _, turn in leaves])
+
+
+def CanonicalMoves(board):
+    """Return the available columns of board in its canonical (possibly mirrored) frame."""
+    moves = board.AvailableColumns()
+    if board.CanonicalKey()[1]:
+        return [board.MirrorColumn(col) for col in moves]
+    return moves
+
+
+def CanonicalValues(board, values):
+    """Return per-column policy values of board in its canonical frame."""
+    return values[::-1] if board.CanonicalKey()[1] else values
+
+
+class EvaluationQueue:
+    """Collects leaf positions from pending simulations and evaluates them in one batch."""
+
+    def __init__(self, rl_policy):
+        self.rl_policy = rl_policy
+        self.boards = []
+        self.nodes = []
+
+    def __len__(self):
+        return len(self.boards)
+
+    def add(self, board, node=None):
+        """Queue board; its values are stored on node (if any) when the queue is flushed."""
+        self.boards.append(board)
+        self.nodes.append(node)
+
+    def flush(self, store):
+        """Evaluate every queued board, store the values on their nodes and return them."""
+        if not self.boards:
+            return None
+        q_values = PredictBatch(self.rl_policy, self.boards)
+        for board, node, values in zip(self.boards, self.nodes, q_values):
+            if node is not None:
+                store.set_q_values(node, CanonicalValues(board, values))
+        self.boards = []
+        self.nodes = []
+        return q_values
+
 
 class uct_tree:
-    def __init__(self, player, rl_policy, board, num_simulations=1000):
+    def __init__(self, player, rl_policy, board, num_simulations=1000, store="object", max_nodes=None,
+                 parallel=None, workers=None, batch_size=None, eval_batch_size=None, rollout_policy=None):
         self.player = player
         self.rl_policy = rl_policy
+        # Move choice during rollouts: a RolloutPolicy or one of rollout_policy.ROLLOUT_POLICIES
+        self.rollout_policy = MakeRolloutPolicy(rollout_policy, rl_policy)
         self.num_simulations = num_simulations
         self.exploration_weight = 1.0
+
+        # Parallel search: "root" merges independent trees, "leaf" batches rollouts with virtual loss
+        if parallel not in PARALLEL_MODES:
+            raise ValueError(f"Invalid parallel mode: {parallel}. Valid modes: None, 'root', 'leaf'.")
+        self.parallel = parallel
+        self.store_type = store
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None  # Process pool, started on the first parallel search
+
+        # Batched evaluation: leaves and rollout plies go to rl_policy in batches of this size
+        self.eval_batch_size = eval_batch_size
+        self.batch_size = batch_size or eval_batch_size or self.workers * 4
+        self.defer_evaluation = False
+        self.last_expanded = None
+
+        # Node storage: "object" keeps UCT_Node instances, "array" keeps NumPy arrays
+        self.store = MakeStore(store, board.cols, max_nodes=max_nodes)
+        self.table = {}  # Transposition table: position key -> node id
+        self.transpositions = 0  # Transposition hits during the last search
+        self.stats = {}  # Simulation count, elapsed time and rate of the last search
         
         # Initialize the board explicitly
         self.board = board
         
-        # Create the UCT_Node with the provided board
-        self.root = UCT_Node(self.board, self.player)
-        self.root.q_values = rl_policy.predict(self.board)
+        # Create the root node for the provided board; search() reuses it
+        self.root = None
+        self.set_root(self.board)
+
+    def StateKey(self, board, player):
+        """Return the transposition key of board with player to move.
+
+        Mirror-image positions share a key, and their nodes store moves and
+        policy values in the canonical frame (see Board.CanonicalKey).
+        """
+        return board.CanonicalKey()[0] ^ (TURN_KEY if player == 'Y' else 0)
 
-    def search(self, board):
-    # Initialize the root node based on the current board state
-        root = UCT_Node(board, self.player)
+    def set_root(self, board):
+        """Re-root the tree at the position on board, keeping the statistics gathered below it.
 
+        After our move and the opponent's reply the new root is the matching
+        grandchild, which the transposition table finds directly. Nodes no longer
+        reachable from the new root are dropped.
+        """
+        key = self.StateKey(board, self.player)
+        root = self.table.get(key)
+        if root is None:
+            self.store.clear()
+            terminal = board.CheckWin('R') or board.CheckWin('Y')
+            root = self.store.new_node(self.player, CanonicalMoves(board), terminal=terminal)
+            self.table = {key: root}
+        elif root != self.root:
+            root = self.prune(root)
+        self.root = root
+        return root
+
+    def prune(self, root):
+        """Keep only the nodes reachable from root and return root's new id."""
+        reachable = set()
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node not in reachable:
+                reachable.add(node)
+                stack.extend(self.store.children(node).values())
+        remap = self.store.compact(reachable)
+        self.table = {key: remap[node] for key, node in self.table.items() if node in reachable}
+        return remap[root]
+
+    def close(self):
+        """Shut down the worker processes used by parallel search."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def search(self, board, time_budget_ms=None, early_stop=False):
+        """Return the most visited move after searching from board.
+
+        By default num_simulations simulations are run. With time_budget_ms the
+        search instead runs until the wall-clock deadline expires. early_stop
+        ends the search as soon as the leading root move can no longer be
+        overtaken in the remaining budget. Statistics are left in self.stats.
+        """
     # Check if the board is full, if so return None or some "game over" state
         if not board.AvailableColumns():
             print("Game over: Board is full.")
             return None  # Or handle the game over state appropriately
 
-        # Simulate the search for a certain number of iterations
-        for _ in range(self.num_simulations):  # Or any other number of iterations for the search
-            node_to_expand = self.select_node(root)  # Select the node to expand
-            self.expand_node(node_to_expand)  # Expand the selected node
-            reward = self.rollout(node_to_expand.board, self.player)  # Simulate a random game from the expanded node
-            self.backpropagate(node_to_expand, reward)  # Backpropagate the results
+        start = time.perf_counter()
+        deadline = None if time_budget_ms is None else start + time_budget_ms / 1000
+        count = self.num_simulations if deadline is None else None
+        self.stopped_early = False
+        if self.parallel == "root":
+            child_visits, simulations = self.root_parallel_search(board, time_budget_ms, early_stop)
+        else:
+            # Re-root the persistent tree at the current board state
+            root = self.set_root(board)
+            self.transpositions = 0
+            if self.parallel == "leaf":
+                simulations = self.batched_simulations(root, board, count, deadline, early_stop,
+                                                       executor=self.get_executor())
+            elif self.eval_batch_size:
+                simulations = self.batched_simulations(root, board, count, deadline, early_stop)
+            else:
+                simulations = self.run_simulations(root, board, count, deadline, early_stop)
+            child_visits = self.root_child_visits(board)
+        elapsed = time.perf_counter() - start
+        self.stats = {'simulations': simulations, 'elapsed': elapsed,
+                      'simulations_per_second': simulations / elapsed if elapsed > 0 else 0.0,
+                      'stopped_early': self.stopped_early, 'transpositions': self.transpositions}
 
         # After simulation, pick the best move
-        if not root.children:
+        if not child_visits:
             print("Warning: No children in root node, returning a random move.")
             return random.choice(board.AvailableColumns())  # Fallback to random if no children
 
-        best_move = max(root.children.items(), key=lambda item: item[1].visits)[0]
+        best_move = max(child_visits.items(), key=lambda item: item[1])[0]
         return best_move
-    def select_node(self, node):
-        while not node.is_terminal():
-            if not node.is_fully_expanded():
-                return node.expand(self.rl_policy)
-            else:
-                node = node.best_child()
-        return node
-    def expand_node(self, node):
-        if not node.is_fully_expanded():
-            return node.expand(self.rl_policy)
-        return None
-    
+
+    def remaining_simulations(self, done, count, start, deadline):
+        """Estimate how many more simulations fit in the count and/or time budget."""
+        remaining = float('inf') if count is None else count - done
+        if deadline is not None:
+            now = time.perf_counter()
+            if now >= deadline:
+                return 0
+            if done:
+                remaining = min(remaining, done / (now - start) * (deadline - now))
+        return remaining
+
+    def is_decided(self, root, remaining):
+        """Return True when the most visited root move cannot be overtaken within remaining simulations."""
+        visits = sorted(self.store.child_visits(root).values(), reverse=True) + [0, 0]
+        return visits[0] - visits[1] > remaining
+
+    def root_child_visits(self, board):
+        """Return {column: visits} for the root's children, in board's own frame."""
+        child_visits = self.store.child_visits(self.root)
+        if board.CanonicalKey()[1]:
+            return {board.MirrorColumn(move): visits for move, visits in child_visits.items()}
+        return child_visits
+
+    def run_simulations(self, root, board, count, deadline=None, early_stop=False):
+        """Run select/rollout/backpropagate iterations from root until the budget is spent.
+
+        Returns the number of simulations run.
+        """
+        # One working copy is walked down the tree with play/undo for every simulation
+        search_board = board.copy()
+        depth = len(search_board.moves)
+        start = time.perf_counter()
+        done = 0
+        while True:
+            remaining = self.remaining_simulations(done, count, start, deadline)
+            if remaining <= 0:
+                break
+            if early_stop and done and done % EARLY_STOP_INTERVAL == 0 and self.is_decided(root, remaining):
+                self.stopped_early = True
+                break
+            path = self.select_node(root, search_board)  # Select and expand a leaf, applying its moves
+            reward = self.rollout(search_board, self.store.player(path[-1]))  # Simulate a random game from the leaf
+            self.store.backpropagate(path, reward, self.player)  # Backpropagate the results
+            while len(search_board.moves) > depth:
+                search_board.undo()
+            done += 1
+        return done
+
+    def batched_simulations(self, root, board, count, deadline=None, early_stop=False, executor=None):
+        """Run simulations in batches until the budget is spent and return how many ran.
+
+        Each batch selects up to batch_size leaves, and each selected path carries
+        a virtual loss until its result is in, so one batch spreads over different
+        leaves. The new leaves are evaluated together through the evaluation
+        queue. The rollouts are then played in lockstep with one predict_batch
+        call per ply, or sent to the process pool when executor is given.
+        """
+        search_board = board.copy()
+        depth = len(search_board.moves)
+        queue = EvaluationQueue(self.rl_policy)
+        start = time.perf_counter()
+        done = 0
+        self.defer_evaluation = True
+        try:
+            while True:
+                remaining = self.remaining_simulations(done, count, start, deadline)
+                if remaining <= 0:
+                    break
+                if early_stop and done and self.is_decided(root, remaining):
+                    self.stopped_early = True
+                    break
+                batch = []
+                for _ in range(int(max(1, min(self.batch_size, remaining)))):
+                    self.last_expanded = None
+                    path = self.select_node(root, search_board)
+                    self.store.add_virtual_loss(path)
+                    leaf = search_board.copy()
+                    queue.add(leaf, self.last_expanded)
+                    batch.append((path, leaf, self.store.player(path[-1])))
+                    while len(search_board.moves) > depth:
+                        search_board.undo()
+                leaf_values = queue.flush(self.store)
+
+                if executor is None:
+                    rewards = self.batch_rollout([leaf for _, leaf, _ in batch], [turn for _, _, turn in batch],
+                                                 leaf_values)
+                else:
+                    # One task per worker keeps the inter-process traffic per batch small
+                    order = [i for w in range(self.workers) for i in range(w, len(batch), self.workers)]
+                    tasks = [(self.player, self.rl_policy, [batch[i][1:] for i in range(w, len(batch), self.workers)],
+                              random.getrandbits(63), self.rollout_policy) for w in range(min(self.workers, len(batch)))]
+                    rewards = [0] * len(batch)
+                    results = [reward for chunk in executor.map(_RolloutWorker, tasks) for reward in chunk]
+                    for i, reward in zip(order, results):
+                        rewards[i] = reward
+                for (path, _, _), reward in zip(batch, rewards):
+                    self.store.add_virtual_loss(path, -1)
+                    self.store.backpropagate(path, reward, self.player)
+                done += len(batch)
+        finally:
+            self.defer_evaluation = False
+        return done
+
+    def root_parallel_search(self, board, time_budget_ms=None, early_stop=False):
+        """Search independent trees in every worker and sum their root visit counts.
+
+        Returns the merged {move: visits} and the total number of simulations.
+        """
+        per_worker = -(-self.num_simulations // self.workers)
+        tasks = [(self.player, self.rl_policy, board, per_worker, self.store_type, time_budget_ms, early_stop,
+                  random.getrandbits(63), self.rollout_policy) for _ in range(self.workers)]
+        child_visits = {}
+        simulations = 0
+        for visits, worker_simulations, stopped_early in self.get_executor().map(_RootSearchWorker, tasks):
+            simulations += worker_simulations
+            self.stopped_early = self.stopped_early or stopped_early
+            for move, count in visits.items():
+                child_visits[move] = child_visits.get(move, 0) + count
+        return child_visits, simulations
+
+    def select_node(self, node, board):
+        """Descend from node to a leaf, expanding one child, and return the path taken.
+
+        Every move along the path is played on board. Nodes hold moves in the
+        canonical frame, so they are mirrored whenever board is the mirror image.
+        """
+        store = self.store
+        path = [node]
+        while not store.is_terminal(node):
+            mirrored = board.CanonicalKey()[1]
+            if not store.is_fully_expanded(node):
+                if not store.has_room():
+                    return path  # Store is full: roll out from this leaf
+                move = store.pop_untried_move(node)
+                player = store.player(node)
+                won = board.play(board.MirrorColumn(move) if mirrored else move, player)
+                next_player = 'Y' if player == 'R' else 'R'
+                key = self.StateKey(board, next_player)
+                child = self.table.get(key)
+                if child is not None:
+                    # Same position reached by another move order: share its node and keep descending
+                    store.link(node, move, child)
+                    self.transpositions += 1
+                    node = child
+                    path.append(node)
+                    continue
+                child = store.add_child(node, move, next_player, CanonicalMoves(board), terminal=won)
+                if self.defer_evaluation:
+                    self.last_expanded = child  # Evaluated with the rest of the batch
+                else:
+                    store.set_q_values(child, CanonicalValues(board, self.rl_policy.predict(board)))
+                self.table[key] = child
+                path.append(child)
+                return path
+            move, child = store.best_child(node)
+            board.play(board.MirrorColumn(move) if mirrored else move, store.player(node))
+            node = child
+            path.append(node)
+        return path
+
     def rollout(self, board, player):
-        rollout_board = copy.deepcopy(board)
+        """Play the game out from board with player to move and undo the moves afterwards."""
         turn = player
+        played = []
 
         while True:
-            if rollout_board.CheckWin('R'):
-                return 1 if self.player == 'R' else -1
-            if rollout_board.CheckWin('Y'):
-                return 1 if self.player == 'Y' else -1
-            available_moves = rollout_board.AvailableColumns()
+            if board.CheckWin('R'):
+                result = 1 if self.player == 'R' else -1
+                break
+            if board.CheckWin('Y'):
+                result = 1 if self.player == 'Y' else -1
+                break
+            available_moves = board.AvailableColumns()
             if not available_moves:
-                return 0  # Draw, if no available moves
+                result = 0  # Draw, if no available moves
+                break
 
-            # Select a random move using the RL policy
-            q_values = self.rl_policy.predict(rollout_board)
-            best_move = np.argmax(q_values)
-
-            # Get the row where the piece should be placed
-            row = rollout_board.AvailableRowInColumn(best_move)
-            if row != -1:  # Ensure the column is not full
-                rollout_board.board[row][best_move] = 'R' if turn == 'R' else 'Y'
+            move = self.rollout_policy.select(board, turn, len(played))
+            board.play(move, turn)
+            played.append(move)
 
             # Switch turns between 'R' and 'Y'
             turn = 'Y' if turn == 'R' else 'R'
 
-    def backpropagate(self, node, reward):
-        while node is not None:
-            node.visits += 1
-            node.q_value += reward
-            reward = -reward
-            node = node.parent
\ No newline at end of file
+        for col in reversed(played):
+            board.undo(col)
+        return result
+
+    def batch_rollout(self, boards, turns, q_values=None):
+        """Play out many boards in lockstep with one policy evaluation per ply.
+
+        boards are played on directly; q_values, if given, are the policy values
+        already computed for the boards at the first ply.
+        """
+        results = [0] * len(boards)
+        turns = list(turns)
+        active = list(range(len(boards)))
+        ply = 0
+        while active:
+            playing = []
+            for i in active:
+                if boards[i].CheckWin('R'):
+                    results[i] = 1 if self.player == 'R' else -1
+                elif boards[i].CheckWin('Y'):
+                    results[i] = 1 if self.player == 'Y' else -1
+                elif boards[i].AvailableColumns():
+                    playing.append(i)
+            if not playing:
+                break
+            rows = None if q_values is None else [q_values[i] for i in playing]  # Values passed in cover every board
+            moves = self.rollout_policy.select_batch([boards[i] for i in playing], [turns[i] for i in playing],
+                                                     ply, rows)
+            for i, move in zip(playing, moves):
+                boards[i].play(move, turns[i])
+                turns[i] = 'Y' if turns[i] == 'R' else 'R'
+            active = playing
+            q_values = None
+            ply += 1
+        return results
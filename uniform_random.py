@@ -20,8 +20,7 @@ class Uniform_Random:
                 break
 
             selected_column = random.choice(available_columns)
-            row = board.AvailableRowInColumn(selected_column)
-            board.board[row][selected_column] = turn
+            won = board.play(selected_column, turn)
 
             print(f"Move selected: {selected_column + 1}\n")
 
@@ -30,7 +29,7 @@ class Uniform_Random:
                 board.PrintBoard()
 
             # Check if the current player wins
-            if board.CheckWin(turn):
+            if won:
                 print(f"Game Over! {turn} Player wins.")
                 done = True
             elif not board.AvailableColumns():  # Check for a draw
@@ -0,0 +1,126 @@
+import numpy as np  # type: ignore
+from board import *
+
+WIN_LENGTH = 4
+
+
+class VectorBoard:
+    """K Connect Four boards advanced in lockstep.
+
+    Cells live in a (K, rows, cols) int8 tensor using the Board conventions:
+    row 0 is the top, 0 is empty, 1 is red and 2 is yellow. Zobrist hashes are
+    kept per board and match Board.StateToKey for the same position. Boards
+    reset to the empty position, or to start (a Board) when one is given.
+    """
+
+    def __init__(self, num_boards, rows=ROWS, cols=COLUMNS, first_player=1, auto_reset=True, start=None):
+        self.num_boards = num_boards
+        self.rows = rows
+        self.cols = cols
+        self.first_player = first_player
+        self.auto_reset = auto_reset
+        self.height = rows + 1
+        self.zobrist = np.array(Board(rows, cols)._zobrist, dtype=np.uint64)
+        self.grid = np.zeros((num_boards, rows, cols), dtype=np.int8)
+        self.heights = np.zeros((num_boards, cols), dtype=np.int8)
+        self.turn = np.zeros(num_boards, dtype=np.int8)  # Player to move, 1 or 2
+        self.hashes = np.zeros(num_boards, dtype=np.uint64)
+        self.mirror_hashes = np.zeros(num_boards, dtype=np.uint64)  # Hashes of the mirrored boards
+        self.num_moves = np.zeros(num_boards, dtype=np.int16)
+        self.done = np.zeros(num_boards, dtype=bool)
+        self.winner = np.zeros(num_boards, dtype=np.int8)  # 0 for a draw or unfinished game
+        if start is None:
+            start = Board(rows, cols)
+        self.start_grid = np.array(start.StateToGrid(), dtype=np.int8)
+        self.start_heights = np.array(start.heights, dtype=np.int8)
+        self.start_hash = np.uint64(start.StateToKey())
+        self.start_mirror_hash = np.uint64(start.mirror_hash)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Clear the boards selected by mask (all boards by default)."""
+        if mask is None:
+            mask = np.ones(self.num_boards, dtype=bool)
+        self.grid[mask] = self.start_grid
+        self.heights[mask] = self.start_heights
+        self.turn[mask] = self.first_player
+        self.hashes[mask] = self.start_hash
+        self.mirror_hashes[mask] = self.start_mirror_hash
+        self.num_moves[mask] = self.start_heights.sum()
+        self.done[mask] = False
+        self.winner[mask] = 0
+
+    def legal_moves(self):
+        """Return a (K, cols) bool mask of playable columns; finished boards have none."""
+        return (self.heights < self.rows) & ~self.done[:, None]
+
+    def step(self, actions):
+        """Drop one piece for the player to move on every unfinished board.
+
+        Returns (winner, done) for this step before any auto-reset: winner is the
+        player who just won (0 otherwise) and done marks boards that finished.
+        Finished boards are cleared afterwards when auto_reset is set.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        active = np.flatnonzero(~self.done)
+        cols = actions[active]
+        heights = self.heights[active, cols].astype(np.int64)
+        if np.any(heights >= self.rows):
+            raise ValueError("Cannot play in a full column.")
+        players = self.turn[active]
+        self.grid[active, self.rows - 1 - heights, cols] = players
+        self.heights[active, cols] += 1
+        self.hashes[active] ^= self.zobrist[players - 1, cols * self.height + heights]
+        self.mirror_hashes[active] ^= self.zobrist[players - 1, (self.cols - 1 - cols) * self.height + heights]
+        self.num_moves[active] += 1
+
+        won = self.wins(self.grid[active] == players[:, None, None])
+        drawn = ~won & (self.num_moves[active] == self.rows * self.cols)
+        winner = np.zeros(self.num_boards, dtype=np.int8)
+        winner[active[won]] = players[won]
+        done = np.zeros(self.num_boards, dtype=bool)
+        done[active[won | drawn]] = True
+        self.winner[active[won]] = players[won]
+        self.done |= done
+        self.turn[active] = 3 - players
+
+        if self.auto_reset and done.any():
+            self.reset(done)
+        return winner, done
+
+    @staticmethod
+    def wins(pieces):
+        """Return a (K,) mask of boards whose (K, rows, cols) bool pieces hold four in a row."""
+        n = WIN_LENGTH
+        rows, cols = pieces.shape[1:]
+        horizontal = pieces[:, :, :cols - n + 1].copy()
+        vertical = pieces[:, :rows - n + 1, :].copy()
+        diagonal = pieces[:, :rows - n + 1, :cols - n + 1].copy()
+        anti_diagonal = pieces[:, n - 1:, :cols - n + 1].copy()
+        for i in range(1, n):
+            horizontal &= pieces[:, :, i:cols - n + 1 + i]
+            vertical &= pieces[:, i:rows - n + 1 + i, :]
+            diagonal &= pieces[:, i:rows - n + 1 + i, i:cols - n + 1 + i]
+            anti_diagonal &= pieces[:, n - 1 - i:rows - i, i:cols - n + 1 + i]
+        return (horizontal.any(axis=(1, 2)) | vertical.any(axis=(1, 2)) |
+                diagonal.any(axis=(1, 2)) | anti_diagonal.any(axis=(1, 2)))
+
+    def canonical_keys(self):
+        """Return (keys, mirrored) arrays matching Board.CanonicalKey for every board."""
+        mirrored = self.mirror_hashes < self.hashes
+        return np.where(mirrored, self.mirror_hashes, self.hashes), mirrored
+
+    def states(self):
+        """Return the boards as a (K, rows * cols) float32 array, as the DQN agent expects."""
+        return self.grid.reshape(self.num_boards, -1).astype(np.float32)
+
+    def random_actions(self, rng=np.random):
+        """Pick a uniformly random legal column on every board (0 on finished boards)."""
+        scores = rng.random_sample((self.num_boards, self.cols))
+        return np.argmax(np.where(self.legal_moves(), scores, -1.0), axis=1)
+
+    def ToBoard(self, index):
+        """Return board index as a Board."""
+        board = Board(self.rows, self.cols)
+        board.board = [[INT_TO_SYMBOL[int(cell)] for cell in row] for row in self.grid[index]]
+        return board